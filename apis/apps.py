@@ -1,6 +1,13 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apis'
+
+    def ready(self):
+        # Large multipart uploads spool here; Django doesn't create the directory itself
+        os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
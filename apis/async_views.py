@@ -0,0 +1,156 @@
+"""
+ASGI-native versions of the read-heavy mobile API views.
+
+They return exactly what the DRF views in apis.views return, but run on the
+event loop with Django's async ORM instead of holding a worker thread per
+request. apis.urls routes to them when settings.ASYNC_VIEWS is enabled.
+"""
+import functools
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db.models import Sum
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+from apis import views
+from apis.conditional import auser_data_conditional
+from apis.serializers import RewardHistoryRowSerializer, UserProfileSerializer
+from rewards.archive import aarchived_points
+from rewards.models import RedemptionRequest, RewardHistory, User
+
+
+logger = logging.getLogger('apis')
+
+# Same scheme as the DRF views: ClaimsJWTAuthentication, or plain JWT with JWT_STATELESS_AUTH off
+authenticator = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+
+
+async def authenticate(request):
+    """The authenticated user, None without credentials; raises AuthenticationFailed."""
+    if hasattr(authenticator, 'aauthenticate'):
+        return await authenticator.aauthenticate(request)
+    result = await sync_to_async(authenticator.authenticate)(request)
+    return result[0] if result else None
+
+
+def render_response(data, status_code=status.HTTP_200_OK, headers=None):
+    """Render like a DRF Response would, with the first configured renderer."""
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    response = HttpResponse(renderer.render(data), status=status_code, content_type=renderer.media_type)
+    response['Vary'] = 'Accept'
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def async_api_view(methods, fallback=None):
+    """
+    Authenticate like the DRF views (JWT, IsAuthenticated) and dispatch to an
+    async view. Methods outside `methods` go to the sync `fallback` view;
+    without one they get a 405 with an Allow header, as api_view would.
+    HEAD is served by the GET view and OPTIONS answered without auth.
+    """
+    allowed = list(methods) + (['HEAD'] if 'GET' in methods else []) + ['OPTIONS']
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            method = 'GET' if request.method == 'HEAD' else request.method
+            if method not in methods:
+                if fallback is not None:
+                    return await sync_to_async(fallback)(request, *args, **kwargs)
+                if method == 'OPTIONS':
+                    return render_response({
+                        'name': view.__name__.replace('_', ' ').title(),
+                        'renders': [renderer.media_type for renderer in api_settings.DEFAULT_RENDERER_CLASSES],
+                        'parses': [parser.media_type for parser in api_settings.DEFAULT_PARSER_CLASSES],
+                    }, headers={'Allow': ', '.join(allowed)})
+                return render_response(
+                    {'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED,
+                    {'Allow': ', '.join(allowed)},
+                )
+
+            auth_header = {'WWW-Authenticate': authenticator.authenticate_header(request)}
+            try:
+                user = await authenticate(request)
+            except exceptions.AuthenticationFailed as exc:
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                return render_response(data, exc.status_code, auth_header)
+            if user is None:
+                exc = exceptions.NotAuthenticated()
+                return render_response({'detail': exc.detail}, exc.status_code, auth_header)
+
+            request.user = user
+            return await view(request, *args, **kwargs)
+
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+@async_api_view(['GET'], fallback=views.user_profile)
+async def user_profile(request):
+    try:
+        user = await User.objects.aget(pk=request.user.pk)
+        return render_response(UserProfileSerializer(user).data)
+    except Exception:
+        logger.exception("Error in user_profile", extra={'user_id': getattr(request.user, 'id', None)})
+        return render_response({'error': 'Failed to process request'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(['GET'])
+@auser_data_conditional
+async def reward_summary(request):
+    try:
+        total_points = ((await RewardHistory.objects.filter(
+            user=request.user
+        ).aaggregate(total=Sum('points_earned')))['total'] or 0) + await aarchived_points(request.user.id)
+
+        redeemed_points = (await RedemptionRequest.objects.filter(
+            user=request.user,
+            status='pending'
+        ).aaggregate(total=Sum('points')))['total'] or 0
+
+        return render_response({
+            'total_points': total_points,
+            'redeemed_points': redeemed_points
+        })
+    except Exception:
+        logger.exception("Error in reward_summary", extra={'user_id': getattr(request.user, 'id', None)})
+        return render_response({'error': 'Failed to load summary'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(['GET'])
+@auser_data_conditional
+async def reward_history(request):
+    try:
+        history = RewardHistory.objects.filter(
+            user=request.user
+        ).order_by('-created_at')
+
+        return render_response(await RewardHistoryRowSerializer(history).adata())
+    except Exception:
+        logger.exception("Error in reward_history", extra={'user_id': getattr(request.user, 'id', None)})
+        return render_response({'error': 'Failed to load history'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(['GET'])
+@auser_data_conditional
+async def dashboard(request):
+    try:
+        total_points = ((await RewardHistory.objects.filter(
+            user=request.user
+        ).aaggregate(total=Sum('points_earned')))['total'] or 0) + await aarchived_points(request.user.id)
+
+        recent_activity = RewardHistory.objects.filter(
+            user=request.user
+        ).order_by('-created_at')[:5]
+
+        return render_response({
+            'total_points': total_points,
+            'recent_activity': await RewardHistoryRowSerializer(recent_activity).adata()
+        })
+    except Exception:
+        logger.exception("Error in dashboard", extra={'user_id': getattr(request.user, 'id', None)})
+        return render_response({'error': 'Failed to load dashboard'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
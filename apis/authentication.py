@@ -0,0 +1,109 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rewards.models import User
+
+
+# Claims copied into every token so requests can be authenticated without a User query
+USER_CLAIMS = ('phone', 'is_staff', 'is_superuser', 'profile_complete')
+
+
+def user_state_cache_key(user_id):
+    return f"jwt_user_state_{user_id}"
+
+
+def get_user_state(user_id):
+    """
+    Return (is_active, is_staff, is_superuser) for the user, or None if the
+    user no longer exists. Cached for JWT_USER_STATE_CACHE_TIMEOUT seconds so
+    revocation and deletion are noticed without a query on every request.
+    """
+    cache_key = user_state_cache_key(user_id)
+    state = cache.get(cache_key)
+    if state is None:
+        row = User.objects.filter(pk=user_id).values_list('is_active', 'is_staff', 'is_superuser').first()
+        state = tuple(row) if row else False
+        cache.set(cache_key, state, timeout=settings.JWT_USER_STATE_CACHE_TIMEOUT)
+    return state or None
+
+
+async def aget_user_state(user_id):
+    """Async counterpart of get_user_state for the ASGI views."""
+    cache_key = user_state_cache_key(user_id)
+    state = await cache.aget(cache_key)
+    if state is None:
+        row = await User.objects.filter(pk=user_id).values_list('is_active', 'is_staff', 'is_superuser').afirst()
+        state = tuple(row) if row else False
+        await cache.aset(cache_key, state, timeout=settings.JWT_USER_STATE_CACHE_TIMEOUT)
+    return state or None
+
+
+def invalidate_user_state(user_id):
+    cache.delete(user_state_cache_key(user_id))
+
+
+def tokens_for_user(user):
+    """Issue a refresh token carrying the user claims; its access token inherits them."""
+    refresh = RefreshToken.for_user(user)
+    refresh['phone'] = user.phone
+    refresh['is_staff'] = user.is_staff
+    refresh['is_superuser'] = user.is_superuser
+    refresh['profile_complete'] = user.profile_complete
+    return refresh
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds request.user from the signed token claims
+    instead of loading the User row. Columns not carried by the token are
+    loaded lazily, in one query, the first time a view reads them.
+    Tokens issued before the claims existed fall back to the database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+
+        user_id = self.get_user_id(validated_token)
+        return self.user_from_claims(user_id, validated_token, get_user_state(user_id))
+
+    async def aauthenticate(self, request):
+        """Async counterpart of authenticate(); returns the user or None."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return await sync_to_async(super().get_user)(validated_token)
+
+        user_id = self.get_user_id(validated_token)
+        return self.user_from_claims(user_id, validated_token, await aget_user_state(user_id))
+
+    def get_user_id(self, validated_token):
+        try:
+            return int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def user_from_claims(self, user_id, validated_token, state):
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        is_active, is_staff, is_superuser = state
+        if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        # Staff flags changed since the token was issued: make the client log in again
+        if (is_staff, is_superuser) != (validated_token['is_staff'], validated_token['is_superuser']):
+            raise AuthenticationFailed(_("Token claims are out of date"), code="stale_claims")
+
+        return User.from_token_claims(user_id, validated_token, is_active)
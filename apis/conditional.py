@@ -0,0 +1,52 @@
+import functools
+
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from rewards.versions import auser_data_etag, user_data_etag
+
+
+def etag_matches(request, etag):
+    tags = parse_etags(request.headers.get('If-None-Match', ''))
+    return '*' in tags or etag in (tag.removeprefix('W/') for tag in tags)
+
+
+def set_validators(response, etag):
+    response['ETag'] = etag
+    # Clients may keep the body but must revalidate before each use
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def user_data_conditional(view):
+    """
+    ETag a GET view whose output depends only on the user's rewards and
+    redemptions. The version is read before the view runs and a matching
+    If-None-Match returns 304 without any query or serialization.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        etag = user_data_etag(request.user.pk)
+        if etag_matches(request, etag):
+            return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_validators(response, etag)
+        return response
+    return wrapper
+
+
+def auser_data_conditional(view):
+    """Async counterpart of user_data_conditional for apis.async_views."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        etag = await auser_data_etag(request.user.pk)
+        if etag_matches(request, etag):
+            return set_validators(HttpResponseNotModified(), etag)
+        response = await view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_validators(response, etag)
+        return response
+    return wrapper
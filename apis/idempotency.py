@@ -0,0 +1,94 @@
+"""
+Idempotency-Key support for mobile write endpoints.
+
+A client that times out can resend the same request with the same
+Idempotency-Key header and get the first response back, without the view
+running again. Records are scoped to the user and endpoint, and a key
+reused with a different request is refused.
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+# While the first request runs; after this a crashed worker's key frees up
+IN_PROGRESS_TIMEOUT = 60
+# Bodies up to this size are part of the fingerprint, larger ones aren't read;
+# of uploaded files only this many leading bytes are
+FINGERPRINT_BODY_LIMIT = 64 * 1024
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256()
+    content_type = request.content_type.split(';')[0]
+    if content_type == 'multipart/form-data':
+        # The boundary, and so the raw body and its length, changes between retries:
+        # hash the parsed fields and each file's name, size, type and first bytes instead
+        digest.update(f"{request.method}:{request.path}:{content_type}".encode())
+        for name, values in sorted(request.POST.lists()):
+            digest.update(f"{name}={values!r}".encode())
+        for name, files in sorted(request.FILES.lists()):
+            for upload in files:
+                digest.update(f"{name}:{upload.name}:{upload.size}:{upload.content_type}:".encode())
+                upload.seek(0)
+                digest.update(upload.read(FINGERPRINT_BODY_LIMIT))
+                upload.seek(0)
+        return digest.hexdigest()
+
+    content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    digest.update(f"{request.method}:{request.path}:{content_type}:{content_length}".encode())
+    if content_length <= FINGERPRINT_BODY_LIMIT:
+        digest.update(request._request.body)
+    return digest.hexdigest()
+
+
+def idempotent(view):
+    """
+    Replay the stored response for a repeated Idempotency-Key. Place it
+    below @api_view; anonymous requests and requests without the header
+    run normally. 5xx responses aren't stored, so those can be retried.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key or not getattr(request.user, 'is_authenticated', False):
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': 'Idempotency-Key too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = "idempotency_%s" % hashlib.sha256(f"{request.user.pk}:{request.path}:{key}".encode()).hexdigest()
+        fingerprint = _fingerprint(request)
+
+        if not cache.add(cache_key, {'fingerprint': fingerprint}, IN_PROGRESS_TIMEOUT):
+            record = cache.get(cache_key) or {}
+            if record.get('fingerprint') != fingerprint:
+                return Response(
+                    {'error': 'Idempotency-Key was used for a different request'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if 'status' not in record:
+                return Response(
+                    {'error': 'A request with this Idempotency-Key is still in progress'},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={'Retry-After': '1'},
+                )
+            return Response(record['data'], status=record['status'], headers={'Idempotent-Replayed': 'true'})
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            }, settings.IDEMPOTENCY_KEY_TTL)
+        return response
+    return wrapper
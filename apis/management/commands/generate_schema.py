@@ -0,0 +1,23 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Write the OpenAPI document served at /swagger.json to API_SCHEMA_FILE. Run on each deploy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=settings.API_SCHEMA_FILE, help="Target file (default: API_SCHEMA_FILE)")
+        parser.add_argument("--url", default=None, help="Base URL to write into the schema (default: API_SPEC_URL)")
+
+    def handle(self, *args, **options):
+        from reward_on_perchase.schema import generate_schema
+
+        content = generate_schema(url=options["url"])
+        output = options["output"]
+        tmp_path = f"{output}.tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(content)
+        os.replace(tmp_path, output)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(content):,} bytes to {output}"))
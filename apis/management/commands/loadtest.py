@@ -0,0 +1,318 @@
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rewards.models import Product, ProductQRCode
+
+
+# Path segments that identify a single object are folded so stats group per endpoint
+_ID_SEGMENT = re.compile(r"/(\d+|[0-9a-fA-F-]{36}|[A-Za-z0-9]{20,})(?=/)")
+
+# Synthetic mix: weight of each step a logged-in client repeats after verify-otp
+SYNTHETIC_MIX = (
+    ("scan", 3),
+    ("summary", 4),
+    ("dashboard", 2),
+    ("history", 1),
+)
+
+# Status recorded for a request that got no response within --timeout
+TIMEOUT = "timeout"
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def endpoint_key(method, path):
+    path = path.split("?", 1)[0]
+    return f"{method} {_ID_SEGMENT.sub('/<id>', path)}"
+
+
+class HTTPConnection:
+    """Minimal keep-alive HTTP/1.1 client on asyncio streams (no third-party deps)."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b""):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        lines.append(f"Content-Length: {len(body)}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection")
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            payload = b"".join(chunks)
+        elif "content-length" in response_headers:
+            payload = await self.reader.readexactly(int(response_headers["content-length"]))
+        else:
+            payload = await self.reader.read()
+            await self.close()
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, payload
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, key, elapsed, status):
+        self.latencies[key].append(elapsed)
+        self.statuses[key][status] += 1
+        # No response, a timeout or a server error
+        if status is None or status == TIMEOUT or status >= 500:
+            self.errors[key] += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate load against a running server, either by replaying a JSONL traffic file "
+        "or by synthesising OTP -> verify -> scan -> summary flows, and report per-endpoint "
+        "throughput, latency percentiles and error rates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients")
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+        parser.add_argument(
+            "--timeout", type=float, default=10.0,
+            help="Seconds to wait for each response; slower requests count as errors",
+        )
+        parser.add_argument(
+            "--traffic",
+            help="JSONL file of recorded requests ({\"method\", \"path\", \"headers\", \"json\"|\"body\"} per "
+                 "line). Lines without method and path are skipped. Omit to synthesise traffic.",
+        )
+        parser.add_argument("--codes-file", help="File of plain QR codes (one per line) used by synthetic scans")
+        parser.add_argument(
+            "--seed-codes", type=int, default=0,
+            help="Create this many fresh QR codes in the configured database for synthetic scans "
+                 "(only useful when the target server shares this database).",
+        )
+        parser.add_argument("--phone-prefix", default="99", help="Prefix for synthetic user phone numbers")
+        parser.add_argument("--seed", type=int, default=None, help="Random seed")
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["base_url"])
+        if url.scheme != "http" or not url.hostname:
+            raise CommandError("--base-url must be a plain http:// URL")
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip("/")
+        self.rng = random.Random(options["seed"])
+        if options["timeout"] <= 0:
+            raise CommandError("--timeout must be positive")
+        self.timeout = options["timeout"]
+
+        if options["traffic"]:
+            records = self.load_traffic(options["traffic"])
+            worker_factory = lambda n: self.replay_worker(records, n, options["concurrency"])
+            self.stdout.write(f"Replaying {len(records)} recorded requests")
+        else:
+            self.codes = self.load_codes(options["codes_file"], options["seed_codes"])
+            self.phone_prefix = options["phone_prefix"]
+            worker_factory = self.synthetic_worker
+            self.stdout.write(f"Synthesising traffic with {len(self.codes)} scannable codes")
+
+        stats = Stats()
+        started = time.perf_counter()
+        asyncio.run(self.run(worker_factory, stats, options["concurrency"], options["duration"]))
+        self.report(stats, time.perf_counter() - started)
+
+    def load_traffic(self, path):
+        records = []
+        try:
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict) and record.get("method") and record.get("path"):
+                        records.append(record)
+        except OSError as exc:
+            raise CommandError(f"Cannot read traffic file: {exc}")
+        if not records:
+            raise CommandError(f"No replayable records (with 'method' and 'path') in {path}")
+        return records
+
+    def load_codes(self, codes_file, seed_count):
+        codes = []
+        if codes_file:
+            with open(codes_file, encoding="utf-8") as fh:
+                codes.extend(line.strip() for line in fh if line.strip())
+        if seed_count:
+            product = Product.objects.filter(is_active=True).order_by("id").first()
+            if product is None:
+                product = Product.objects.create(name="Load test product", points=10)
+            for _ in range(seed_count):
+                codes.append(ProductQRCode.objects.create(product=product).decrypted_code)
+        return codes
+
+    async def run(self, worker_factory, stats, concurrency, duration):
+        self.deadline = time.perf_counter() + duration
+        await asyncio.gather(*(worker_factory(n)(stats) for n in range(concurrency)))
+
+    async def timed(self, conn, stats, method, path, headers=None, body=b""):
+        headers = dict(headers or {})
+        key = endpoint_key(method, path)
+        started = time.perf_counter()
+        try:
+            status, _, payload = await asyncio.wait_for(
+                conn.request(method, self.prefix + path, headers, body), self.timeout
+            )
+        except asyncio.TimeoutError:
+            # The late response would be read as the next request's, so start a fresh connection
+            await conn.close()
+            stats.record(key, time.perf_counter() - started, TIMEOUT)
+            return None, None
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError):
+            await conn.close()
+            stats.record(key, time.perf_counter() - started, None)
+            return None, None
+        stats.record(key, time.perf_counter() - started, status)
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+    async def post_json(self, conn, stats, path, data, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return await self.timed(conn, stats, "POST", path, headers, json.dumps(data).encode())
+
+    def replay_worker(self, records, n, concurrency):
+        async def worker(stats):
+            conn = HTTPConnection(self.host, self.port)
+            index = n
+            while time.perf_counter() < self.deadline:
+                record = records[index % len(records)]
+                index += concurrency
+                headers = dict(record.get("headers") or {})
+                if "json" in record:
+                    body = json.dumps(record["json"]).encode()
+                    headers.setdefault("Content-Type", "application/json")
+                else:
+                    body = (record.get("body") or "").encode()
+                await self.timed(conn, stats, record["method"].upper(), record["path"], headers, body)
+            await conn.close()
+        return worker
+
+    def synthetic_worker(self, n):
+        async def worker(stats):
+            conn = HTTPConnection(self.host, self.port)
+            steps = [name for name, weight in SYNTHETIC_MIX for _ in range(weight)]
+            while time.perf_counter() < self.deadline:
+                phone = f"{self.phone_prefix}{self.rng.randrange(10 ** 8):08d}"
+                status, data = await self.post_json(conn, stats, "/api/send-otp/", {"phone": phone})
+                if status != 200 or not data or "otp" not in data:
+                    continue
+                status, data = await self.post_json(
+                    conn, stats, "/api/verify-otp/", {"phone": phone, "otp": data["otp"]}
+                )
+                if status != 200 or not data or "access" not in data:
+                    continue
+                token = data["access"]
+                auth = {"Authorization": f"Bearer {token}"}
+
+                # A session is a handful of screen opens before the client logs in again
+                for _ in range(self.rng.randint(3, 10)):
+                    if time.perf_counter() >= self.deadline:
+                        break
+                    step = self.rng.choice(steps)
+                    if step == "scan":
+                        code = self.codes.pop() if self.codes else str(uuid.UUID(int=self.rng.getrandbits(128)))
+                        await self.post_json(conn, stats, "/api/scan-qr/", {"qr_code": code}, token)
+                    elif step == "summary":
+                        await self.timed(conn, stats, "GET", "/api/reward-summary/", auth)
+                    elif step == "dashboard":
+                        await self.timed(conn, stats, "GET", "/api/dashboard/", auth)
+                    else:
+                        await self.timed(conn, stats, "GET", "/api/reward-history/", auth)
+            await conn.close()
+        return worker
+
+    def report(self, stats, elapsed):
+        header = f"{'endpoint':<36} {'reqs':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err %':>6}  statuses"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        total = 0
+        total_errors = 0
+        for key in sorted(stats.latencies):
+            latencies = sorted(stats.latencies[key])
+            count = len(latencies)
+            total += count
+            total_errors += stats.errors[key]
+            statuses = " ".join(
+                f"{status or 'conn-err'}:{hits}"
+                for status, hits in sorted(stats.statuses[key].items(), key=lambda item: str(item[0]))
+            )
+            self.stdout.write(
+                f"{key:<36} {count:>7} {count / elapsed:>8.1f} "
+                f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 95) * 1000:>8.1f} "
+                f"{percentile(latencies, 99) * 1000:>8.1f} {100.0 * stats.errors[key] / count:>6.2f}  {statuses}"
+            )
+        self.stdout.write("-" * len(header))
+        rate = total / elapsed if elapsed else 0.0
+        error_rate = 100.0 * total_errors / total if total else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} requests in {elapsed:.1f}s: {rate:.1f} req/s, {error_rate:.2f}% errors (5xx/connection/timeout)"
+        ))
@@ -0,0 +1,23 @@
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    JSON renderer backed by orjson. Output matches rest_framework's
+    JSONRenderer in its compact form: datetimes, Decimals, UUIDs and lazy
+    strings are passed to DRF's own encoder, so values() rows render exactly
+    like serializer output.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=_encoder.default, option=self.options)
@@ -1,5 +1,6 @@
 from django.db.models import Sum
 from rest_framework import serializers
+from rewards.archive import archived_points
 from rewards.models import User, PaymentOption, RewardHistory, Product, ProductQRCode, RedemptionRequest
 from rewards.models import PaymentOption, User
 
@@ -71,7 +72,51 @@ class RedemptionRequestSerializer(serializers.ModelSerializer):
     def validate_points(self, value):
         # Check if the user has enough points
         user = self.context['request'].user
-        total_points = RewardHistory.objects.filter(user=user).aggregate(total=Sum('points_earned'))['total'] or 0
+        total_points = (RewardHistory.objects.filter(user=user).aggregate(total=Sum('points_earned'))['total'] or 0) + archived_points(user.id)
         if value > total_points:
             raise serializers.ValidationError("Insufficient points")
-        return value
\ No newline at end of file
+        return value
+
+# Read-only list serializers: one values() query, rows renamed straight into dicts.
+# Output matches the ModelSerializers above once rendered (the renderer formats datetimes).
+class ValuesSerializer:
+    # output key -> values() lookup
+    fields = {}
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def rows(self):
+        return self.queryset.values_list(*self.fields.values())
+
+    @property
+    def data(self):
+        keys = list(self.fields)
+        return [dict(zip(keys, row)) for row in self.rows()]
+
+    async def adata(self):
+        keys = list(self.fields)
+        return [dict(zip(keys, row)) async for row in self.rows()]
+
+
+class RewardHistoryRowSerializer(ValuesSerializer):
+    fields = {
+        'id': 'id',
+        'product': 'product_id',
+        'product_name': 'product__name',
+        'qr_code': 'qr_code_id',
+        'points_earned': 'points_earned',
+        'created_at': 'created_at',
+    }
+
+
+class PaymentOptionRowSerializer(ValuesSerializer):
+    fields = {
+        'id': 'id',
+        'type': 'type',
+        'upi_id': 'upi_id',
+        'bank_account': 'bank_account',
+        'ifsc_code': 'ifsc_code',
+        'holder_name': 'holder_name',
+        'created_at': 'created_at',
+    }
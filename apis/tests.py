@@ -0,0 +1,434 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from apis.authentication import ClaimsJWTAuthentication, invalidate_user_state, tokens_for_user
+from rewards.balances import get_balance
+from rewards.catalog import get_product
+from rewards.models import PaymentOption, PointsBalance, Product, ProductQRCode, RedemptionRequest, RewardHistory, User
+
+
+def photo(color, size=8):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), color).save(buffer, "JPEG")
+    return SimpleUploadedFile("photo.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone="9100000001")
+        self.other = User.objects.create(phone="9100000002")
+        self.product = Product.objects.create(name="API product", points=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def new_code(self):
+        code = ProductQRCode.objects.create(product=self.product)
+        return code, code.decrypted_code
+
+    def scan(self, plain, **extra):
+        return self.client.post("/api/scan-qr/", {"qr_code": plain}, format="json", **extra)
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    def authenticate(self, token):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return ClaimsJWTAuthentication().authenticate(request)[0]
+
+    def test_user_built_from_claims_without_a_query(self):
+        token = tokens_for_user(self.user).access_token
+        self.authenticate(token)
+
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+            self.assertEqual((user.pk, user.phone, user.profile_complete), (self.user.pk, self.user.phone, False))
+
+    def test_deferred_columns_load_on_first_use(self):
+        User.objects.filter(pk=self.user.pk).update(city="Pune")
+        user = self.authenticate(tokens_for_user(self.user).access_token)
+
+        with self.assertNumQueries(1):
+            self.assertEqual((user.city, user.profession), ("Pune", ""))
+
+    def test_deactivation_is_seen_once_state_is_invalidated(self):
+        token = tokens_for_user(self.user).access_token
+        self.authenticate(token)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        invalidate_user_state(self.user.pk)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_staff_change_makes_claims_stale(self):
+        token = tokens_for_user(self.user).access_token
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_tokens_without_claims_fall_back_to_the_database(self):
+        user = self.authenticate(AccessToken.for_user(self.user))
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertFalse(user.get_deferred_fields())
+
+    def test_profile_update_returns_tokens_with_new_claims(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_for_user(self.user).access_token}")
+
+        response = client.put("/api/profile/", {
+            "first_name": "A", "last_name": "B", "city": "Pune", "profession": "Painter",
+        }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(RefreshToken(response.data["refresh"])["profile_complete"])
+        self.assertTrue(self.authenticate(response.data["access"]).profile_complete)
+
+
+class VerifyOtpTests(APITestCase):
+    def verify(self, phone):
+        cache.set(f"otp_{phone}", "1234", timeout=300)
+        return APIClient().post("/api/verify-otp/", {"phone": phone, "otp": "1234"}, format="json")
+
+    def test_new_user(self):
+        response = self.verify("9100000003")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["new_user"])
+        self.assertTrue(User.objects.get(phone="9100000003").is_phone_verified)
+
+    def test_returning_user(self):
+        User.objects.filter(pk=self.user.pk).update(city="Pune", profession="Painter")
+
+        response = self.verify(self.user.phone)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("new_user", response.data)
+        self.assertTrue(response.data["profile_complete"])
+        self.assertEqual(User.objects.filter(phone=self.user.phone).count(), 1)
+
+    def test_wrong_otp(self):
+        cache.set("otp_9100000003", "1234", timeout=300)
+        response = APIClient().post("/api/verify-otp/", {"phone": "9100000003", "otp": "0000"}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(phone="9100000003").exists())
+
+    def test_one_query_for_new_and_returning_users(self):
+        with self.assertNumQueries(1):
+            user, created = User.objects.verify_phone("9100000004")
+        self.assertTrue(created)
+
+        with self.assertNumQueries(1):
+            again, created = User.objects.verify_phone("9100000004")
+        self.assertFalse(created)
+        self.assertEqual((again.pk, again.date_joined), (user.pk, user.date_joined))
+
+
+class ScanTests(APITestCase):
+    def test_second_scan_of_a_code_is_refused(self):
+        code, plain = self.new_code()
+
+        first = self.scan(plain)
+        second = self.scan(plain)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data["points_earned"], 10)
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(RewardHistory.objects.filter(qr_code=code).count(), 1)
+
+    def test_scan_losing_race_to_another_scan(self):
+        code, plain = self.new_code()
+
+        def claimed_meanwhile(product_id):
+            # Another request flips the row after this one looked it up as unused
+            ProductQRCode.objects.filter(pk=code.pk).update(status="redeemed", redeemed_by=self.other)
+            return get_product(product_id)
+
+        with mock.patch("apis.views.get_product", side_effect=claimed_meanwhile):
+            response = self.scan(plain)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(RewardHistory.objects.filter(qr_code=code).exists())
+        self.assertEqual(ProductQRCode.objects.get(pk=code.pk).redeemed_by, self.other)
+        self.assertEqual(get_balance(self.user.id), 0)
+
+    def test_scan_of_vanished_product(self):
+        code, plain = self.new_code()
+
+        with mock.patch("apis.views.get_product", return_value=None):
+            response = self.scan(plain)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ProductQRCode.objects.get(pk=code.pk).status, "unused")
+
+
+class MediaRootMixin:
+    """Point MEDIA_ROOT and UPLOAD_TEMP_ROOT at a throwaway directory for tests that store photos."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root, UPLOAD_TEMP_ROOT=os.path.join(media_root, "uploads"))
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class RedeemPointsTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.payment = PaymentOption.objects.create(user=self.user, type="upi", upi_id="u@upi")
+        PointsBalance.objects.create(user=self.user, available=20)
+
+    def redeem(self, points, color="red", **extra):
+        return self.client.post(
+            "/api/redeem-points/",
+            {"points": points, "payment_method_id": self.payment.id, "photo": photo(color)},
+            format="multipart", **extra,
+        )
+
+    def test_debits_balance(self):
+        response = self.redeem(15)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {"success", "redemption_id", "status"})
+        self.assertEqual(get_balance(self.user.id), 5)
+
+    def test_insufficient_points_leave_nothing_behind(self):
+        self.assertEqual(self.redeem(15).status_code, 200)
+        response = self.redeem(15)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(RedemptionRequest.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(get_balance(self.user.id), 5)
+
+    def test_other_users_payment_method(self):
+        foreign = PaymentOption.objects.create(user=self.other, type="upi", upi_id="o@upi")
+
+        response = self.client.post(
+            "/api/redeem-points/",
+            {"points": 5, "payment_method_id": foreign.id, "photo": photo("red")},
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(get_balance(self.user.id), 20)
+
+
+class ResumableUploadTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.photo = photo("red").read()
+
+    def start(self, size=None):
+        response = self.client.post("/api/uploads/", {"size": size or len(self.photo)}, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data["upload_id"]
+
+    def send(self, upload_id, offset, data):
+        return self.client.generic(
+            "PATCH", f"/api/uploads/{upload_id}/", data,
+            content_type="application/offset+octet-stream", HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunks_resume_at_the_offset(self):
+        upload_id = self.start()
+        half = len(self.photo) // 2
+
+        self.assertEqual(self.send(upload_id, 0, self.photo[:half]).data["offset"], half)
+        response = self.send(upload_id, half, self.photo[half:])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["complete"])
+        self.assertEqual(self.client.get(f"/api/uploads/{upload_id}/").data["offset"], len(self.photo))
+
+    def test_wrong_offset_reports_where_to_resume(self):
+        upload_id = self.start()
+        self.send(upload_id, 0, self.photo[:10])
+
+        response = self.send(upload_id, 0, self.photo[:10])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["offset"], 10)
+
+    def test_chunk_past_declared_size(self):
+        upload_id = self.start(size=10)
+
+        self.assertEqual(self.send(upload_id, 0, self.photo[:11]).status_code, 413)
+
+    def test_uploads_are_per_user(self):
+        upload_id = self.start()
+        self.client.force_authenticate(self.other)
+
+        self.assertEqual(self.client.get(f"/api/uploads/{upload_id}/").status_code, 404)
+
+    def test_redeem_with_completed_upload(self):
+        payment = PaymentOption.objects.create(user=self.user, type="upi", upi_id="u@upi")
+        PointsBalance.objects.create(user=self.user, available=20)
+        upload_id = self.start()
+        self.send(upload_id, 0, self.photo)
+
+        response = self.client.post(
+            "/api/redeem-points/", {"points": 5, "payment_method_id": payment.id, "upload_id": upload_id}, format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(RedemptionRequest.objects.get(pk=response.data["redemption_id"]).photo)
+        self.assertEqual(self.client.get(f"/api/uploads/{upload_id}/").status_code, 404)
+
+    def test_redeem_with_incomplete_upload(self):
+        payment = PaymentOption.objects.create(user=self.user, type="upi", upi_id="u@upi")
+        upload_id = self.start()
+
+        response = self.client.post(
+            "/api/redeem-points/", {"points": 5, "payment_method_id": payment.id, "upload_id": upload_id}, format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class IdempotencyTests(APITestCase):
+    def test_replay_returns_first_response(self):
+        code, plain = self.new_code()
+
+        first = self.scan(plain, HTTP_IDEMPOTENCY_KEY="scan-1")
+        second = self.scan(plain, HTTP_IDEMPOTENCY_KEY="scan-1")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(RewardHistory.objects.filter(user=self.user).count(), 1)
+
+    def test_key_reused_for_different_request(self):
+        _, plain = self.new_code()
+        _, other_plain = self.new_code()
+
+        self.scan(plain, HTTP_IDEMPOTENCY_KEY="scan-2")
+        response = self.scan(other_plain, HTTP_IDEMPOTENCY_KEY="scan-2")
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(RewardHistory.objects.filter(user=self.user).count(), 1)
+
+    def test_keys_are_per_user(self):
+        _, plain = self.new_code()
+        _, other_plain = self.new_code()
+        self.scan(plain, HTTP_IDEMPOTENCY_KEY="scan-3")
+
+        self.client.force_authenticate(self.other)
+        response = self.scan(other_plain, HTTP_IDEMPOTENCY_KEY="scan-3")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", response)
+
+
+class RedeemIdempotencyTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.payment = PaymentOption.objects.create(user=self.user, type="upi", upi_id="u@upi")
+        PointsBalance.objects.create(user=self.user, available=100)
+
+    def redeem(self, points, color, key):
+        return self.client.post(
+            "/api/redeem-points/",
+            {"points": points, "payment_method_id": self.payment.id, "photo": photo(color)},
+            format="multipart", HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_multipart_replay(self):
+        first = self.redeem(5, "red", "redeem-1")
+        second = self.redeem(5, "red", "redeem-1")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(RedemptionRequest.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(get_balance(self.user.id), 95)
+
+    def test_multipart_with_different_photo_or_fields(self):
+        self.redeem(5, "red", "redeem-2")
+
+        self.assertEqual(self.redeem(5, "blue", "redeem-2").status_code, 422)
+        self.assertEqual(self.redeem(6, "red", "redeem-2").status_code, 422)
+        self.assertEqual(RedemptionRequest.objects.filter(user=self.user).count(), 1)
+
+    def test_only_leading_bytes_of_files_are_hashed(self):
+        # Both photos share their JPEG headers, so a short prefix can't tell them apart
+        with mock.patch("apis.idempotency.FINGERPRINT_BODY_LIMIT", 16):
+            self.redeem(5, "red", "redeem-3")
+            response = self.redeem(5, "blue", "redeem-3")
+
+        self.assertEqual(response["Idempotent-Replayed"], "true")
+
+
+class ConditionalTests(APITestCase):
+    def get_summary(self, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get("/api/reward-summary/", **headers)
+
+    def test_not_modified_until_data_changes(self):
+        first = self.get_summary()
+        etag = first["ETag"]
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.get_summary(etag).status_code, 304)
+
+        _, plain = self.new_code()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.scan(plain).status_code, 200)
+
+        changed = self.get_summary(etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertEqual(changed.data["total_points"], 10)
+
+    def test_other_users_changes_keep_etag(self):
+        etag = self.get_summary()["ETag"]
+
+        self.client.force_authenticate(self.other)
+        _, plain = self.new_code()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.scan(plain)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.get_summary(etag).status_code, 304)
+
+    def test_product_change_invalidates(self):
+        etag = self.get_summary()["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Renamed product"
+            self.product.save()
+
+        self.assertEqual(self.get_summary(etag).status_code, 200)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}})
+    def test_cache_that_keeps_nothing(self):
+        first = self.get_summary()
+        _, plain = self.new_code()
+
+        self.assertEqual(first.status_code, 200)
+        # Every request gets a fresh token, so nothing is ever answered 304
+        self.assertEqual(self.get_summary(first["ETag"]).status_code, 200)
+        self.assertEqual(self.scan(plain).status_code, 200)
+
+    def test_version_tokens_expire_only_in_per_process_caches(self):
+        from rewards.versions import _timeout
+
+        with override_settings(LOCAL_VERSION_TIMEOUT=5):
+            self.assertEqual(_timeout(), 5)
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}):
+            self.assertIsNone(_timeout())
@@ -0,0 +1,154 @@
+import fcntl
+import os
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+
+# Resumable uploads expire if not finished within a day
+UPLOAD_SESSION_TIMEOUT = 60 * 60 * 24
+CHUNK_SIZE = 256 * 1024
+
+
+class PhotoLimitHandler(FileUploadHandler):
+    """
+    First in the upload handler chain for redeem_points: stops a multipart
+    upload as soon as a file is not an image or grows past the photo cap,
+    instead of spooling the whole body to disk first.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_bytes = settings.REDEMPTION_PHOTO_MAX_BYTES
+        self.error = None
+        self.status_code = None
+        self.received = 0
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        self.received = 0
+        # Some clients label camera files generically; anything else named is refused
+        if content_type and not content_type.startswith("image/") and content_type != "application/octet-stream":
+            self.reject("Photo must be an image", 400)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.reject("Photo too large", 413)
+        return raw_data
+
+    def reject(self, error, status_code):
+        self.error = error
+        self.status_code = status_code
+        raise StopUpload(connection_reset=True)
+
+    def file_complete(self, file_size):
+        return None
+
+
+class CompletedUpload(File):
+    """A finished resumable upload; storage moves it into place instead of copying."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class ResumableUpload:
+    """
+    A photo uploaded in chunks across several requests. State lives in the
+    cache; the bytes received so far live in a part file whose size is the
+    resume offset.
+    """
+
+    def __init__(self, upload_id, user_id, size, content_type, filename):
+        self.upload_id = upload_id
+        self.user_id = user_id
+        self.size = size
+        self.content_type = content_type
+        self.filename = filename
+
+    @staticmethod
+    def cache_key(upload_id):
+        return f"photo_upload_{upload_id}"
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_TEMP_ROOT, "partial", f"{self.upload_id}.part")
+
+    @property
+    def offset(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def complete(self):
+        return self.offset == self.size
+
+    @classmethod
+    def create(cls, user_id, size, content_type, filename):
+        upload = cls(uuid.uuid4().hex, user_id, size, content_type, os.path.basename(filename or "photo.jpg"))
+        os.makedirs(os.path.dirname(upload.path), exist_ok=True)
+        open(upload.path, "wb").close()
+        cache.set(cls.cache_key(upload.upload_id), {
+            "user_id": user_id,
+            "size": size,
+            "content_type": content_type,
+            "filename": upload.filename,
+        }, timeout=UPLOAD_SESSION_TIMEOUT)
+        return upload
+
+    @classmethod
+    def get(cls, upload_id, user_id):
+        """Return the user's upload, or None if unknown, expired or someone else's."""
+        state = cache.get(cls.cache_key(upload_id))
+        if not state or state["user_id"] != user_id:
+            return None
+        return cls(upload_id, **state)
+
+    def append(self, stream, content_length, expected_offset=None):
+        """
+        Append a chunk read from stream; returns the new offset. Never grows past size.
+        With expected_offset, returns None without writing if the file has a different length.
+        """
+        with open(self.path, "ab") as fh:
+            # Two requests resuming the same upload would otherwise both pass the size check
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                offset = os.fstat(fh.fileno()).st_size
+                if expected_offset is not None and expected_offset != offset:
+                    return None
+                remaining = min(content_length, self.size - offset)
+                while remaining > 0:
+                    data = stream.read(min(CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    fh.write(data)
+                    remaining -= len(data)
+                fh.flush()
+                return os.fstat(fh.fileno()).st_size
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def as_file(self):
+        return CompletedUpload(open(self.path, "rb"), name=self.filename)
+
+    def discard(self):
+        cache.delete(self.cache_key(self.upload_id))
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def to_dict(self):
+        offset = self.offset
+        return {
+            "upload_id": self.upload_id,
+            "size": self.size,
+            "offset": offset,
+            "complete": offset == self.size,
+            "chunk_size": CHUNK_SIZE,
+        }
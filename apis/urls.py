@@ -1,16 +1,22 @@
 # urls.py
+from django.conf import settings
 from django.urls import path
-from apis import views
+from apis import async_views, views
+
+# Read-heavy endpoints run natively on the event loop under ASGI
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     path('send-otp/', views.send_otp),
     path('verify-otp/', views.verify_otp),
-    path('profile/', views.user_profile),
+    path('profile/', read_views.user_profile),
     path('payment-methods/', views.payment_methods),
     path('scan-qr/', views.scan_qr_code),
-    path('reward-summary/', views.reward_summary),
-    path('reward-history/', views.reward_history),
+    path('reward-summary/', read_views.reward_summary),
+    path('reward-history/', read_views.reward_history),
     path('redeem-points/', views.redeem_points),
-    path('dashboard/', views.dashboard),
+    path('uploads/', views.create_photo_upload),
+    path('uploads/<str:upload_id>/', views.photo_upload),
+    path('dashboard/', read_views.dashboard),
     path('delete-account/', views.delete_account),
 ]
\ No newline at end of file
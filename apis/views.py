@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.core.cache import cache
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Sum
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
@@ -7,12 +9,24 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 import random
-from apis.serializers import PaymentOptionSerializer, RewardHistorySerializer, UserProfileSerializer
+from apis.serializers import (
+    PaymentOptionRowSerializer, PaymentOptionSerializer, RewardHistoryRowSerializer, UserProfileSerializer,
+)
 from rewards.models import PaymentOption, ProductQRCode, RedemptionRequest, RewardHistory, User
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
+from apis.authentication import invalidate_user_state, tokens_for_user
+from apis.uploads import PhotoLimitHandler, ResumableUpload
+from rewards.photos import schedule_redemption_photo
+from rewards.archive import archived_points
+from rewards.balances import InsufficientPoints, credit_points, debit_points, ensure_balance
+from rewards.catalog import get_product
+from rewards.qr_payload import parse_code
+from rewards.response_cache import invalidate_response
+from apis.conditional import user_data_conditional
+from apis.idempotency import idempotent
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+import functools
 import logging
 import hashlib
 
@@ -20,6 +34,32 @@ import hashlib
 
 logger = logging.getLogger('apis')
 
+# Room for the non-file multipart fields on top of the photo size cap
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def limit_photo_upload(view):
+    """
+    Refuse oversized bodies before reading them, and cap the photo while it
+    streams in. Goes above @idempotent, whose fingerprint parses the body.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if content_length > settings.REDEMPTION_PHOTO_MAX_BYTES + MULTIPART_OVERHEAD:
+            logger.warning("Redemption upload too large", extra={'user_id': getattr(request.user, 'id', None), 'content_length': content_length})
+            return Response({'error': 'Photo too large'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        request.photo_limit = PhotoLimitHandler(request)
+        request.upload_handlers.insert(0, request.photo_limit)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+IDEMPOTENCY_KEY_PARAMETER = openapi.Parameter(
+    'Idempotency-Key', openapi.IN_HEADER, type=openapi.TYPE_STRING, required=False,
+    description="Unique per logical request; a retry with the same key returns the original response",
+)
+
 
 def otp_is_valid(phone, otp):
     """
@@ -85,11 +125,10 @@ def verify_otp(request):
     otp = request.data.get('otp')
     try:
         if otp_is_valid(phone, otp):
-            user, created = User.objects.get_or_create(phone=phone)
+            # One upsert for new and returning users alike
+            user, created = User.objects.verify_phone(phone)
+            refresh = tokens_for_user(user)
             if created:
-                user.is_phone_verified = True
-                user.save()
-                refresh = RefreshToken.for_user(user)
                 logger.info("New user created via OTP", extra={'user_id': user.id})
                 return Response({
                     'new_user': True,
@@ -97,12 +136,11 @@ def verify_otp(request):
                     'access': str(refresh.access_token),
                 })
 
-            refresh = RefreshToken.for_user(user)
             logger.info("OTP verified for existing user", extra={'user_id': user.id})
             return Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
-                'profile_complete': bool(user.city and user.profession)
+                'profile_complete': user.profile_complete
             })
         logger.warning("Invalid OTP attempt", extra={'phone': phone})
         return Response({'error': 'Invalid OTP'}, status=status.HTTP_400_BAD_REQUEST)
@@ -129,7 +167,7 @@ def verify_otp(request):
         required=['first_name', 'last_name'],  # adjust based on serializer
     ),
     responses={
-        200: "Profile updated successfully",
+        200: "Profile updated successfully, with fresh refresh/access tokens",
         400: "Validation error",
     }
 )
@@ -143,9 +181,16 @@ def user_profile(request):
         elif request.method == 'PUT':
             serializer = UserProfileSerializer(request.user, data=request.data)
             if serializer.is_valid():
-                serializer.save()
+                user = serializer.save()
+                invalidate_user_state(user.id)
                 logger.info("User profile updated", extra={'user_id': getattr(request.user, 'id', None)})
-                return Response(serializer.data)
+                # The profile_complete claim may have changed: hand back tokens carrying the new value
+                refresh = tokens_for_user(user)
+                return Response({
+                    **serializer.data,
+                    'refresh': str(refresh),
+                    'access': str(refresh.access_token),
+                })
             logger.warning("User profile validation failed", extra={'errors': serializer.errors})
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     except Exception:
@@ -162,8 +207,7 @@ def payment_methods(request):
     try:
         if request.method == 'GET':
             payments = PaymentOption.objects.filter(user=request.user)
-            serializer = PaymentOptionSerializer(payments, many=True)
-            return Response(serializer.data)
+            return Response(PaymentOptionRowSerializer(payments).data)
 
         elif request.method == 'POST':
             serializer = PaymentOptionSerializer(data=request.data)
@@ -182,42 +226,65 @@ def payment_methods(request):
     request_body=openapi.Schema(
         type=openapi.TYPE_OBJECT,
         properties={
-            'qr_code': openapi.Schema(type=openapi.TYPE_STRING, description="Scanned QR Code"),
+            'qr_code': openapi.Schema(type=openapi.TYPE_STRING, description="Scanned QR Code: UUID, compact code, or the full URL"),
         },
         required=['qr_code'],
     ),
+    manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
     responses={200: "Points earned", 400: "Invalid QR code"},
 )
 @api_view(['POST'])
+@idempotent
 def scan_qr_code(request):
-    qr_code = request.data.get('qr_code')  # plain UUID from QR
+    qr_code = request.data.get('qr_code')  # UUID or compact code from QR
 
     if not qr_code:
         return Response({'error': 'QR code required'}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        # Deterministic lookup with hash
-        qr_hash = hashlib.sha256(qr_code.encode()).hexdigest()
-        product_qr = ProductQRCode.objects.get(code_hash=qr_hash, status='unused')
-
-        product_qr.status = 'redeemed'
-        product_qr.redeemed_by = request.user
-        product_qr.redeemed_at = timezone.now()
-        product_qr.save()
+        # Malformed and forged signed codes are turned away before touching the database
+        plain_code = parse_code(qr_code)
+        if plain_code is None:
+            raise ProductQRCode.DoesNotExist
 
-        RewardHistory.objects.create(
-            user=request.user,
-            product=product_qr.product,
-            qr_code=product_qr,
-            points_earned=product_qr.product.points
-        )
+        # Deterministic lookup with hash
+        qr_hash = hashlib.sha256(plain_code.encode()).hexdigest()
+        qr_id, product_id = ProductQRCode.objects.for_code(plain_code).filter(
+            status='unused'
+        ).values_list('id', 'product_id').get()
+
+        # One catalog snapshot: the points credited are the points reported
+        product = get_product(product_id)
+        if product is None:
+            # Product deleted since the code was looked up
+            raise ProductQRCode.DoesNotExist
+
+        with transaction.atomic():
+            # Conditional flip: of two concurrent scans only one updates the row
+            claimed = ProductQRCode.objects.filter(pk=qr_id, status='unused').update(
+                status='redeemed',
+                redeemed_by=request.user,
+                redeemed_at=timezone.now(),
+            )
+            if not claimed:
+                raise ProductQRCode.DoesNotExist
+
+            RewardHistory.objects.create(
+                user=request.user,
+                product_id=product_id,
+                qr_code_id=qr_id,
+                points_earned=product.points
+            )
+            credit_points(request.user.id, product.points)
+            # update() skips the model signals that drop the cached status page
+            transaction.on_commit(lambda: invalidate_response('qr_status', qr_hash))
 
         logger.info("QR code redeemed", extra={'user_id': getattr(request.user, 'id', None), 'qr_code': qr_code})
 
         return Response({
             'success': True,
-            'points_earned': product_qr.product.points,
-            'product_name': product_qr.product.name
+            'points_earned': product.points,
+            'product_name': product.name
         })
 
     except ProductQRCode.DoesNotExist:
@@ -230,11 +297,12 @@ def scan_qr_code(request):
 
 
 @api_view(['GET'])
+@user_data_conditional
 def reward_summary(request):
     try:
-        total_points = RewardHistory.objects.filter(
+        total_points = (RewardHistory.objects.filter(
             user=request.user
-        ).aggregate(total=Sum('points_earned'))['total'] or 0
+        ).aggregate(total=Sum('points_earned'))['total'] or 0) + archived_points(request.user.id)
 
         redeemed_points = RedemptionRequest.objects.filter(
             user=request.user,
@@ -251,14 +319,14 @@ def reward_summary(request):
 
 
 @api_view(['GET'])
+@user_data_conditional
 def reward_history(request):
     try:
         history = RewardHistory.objects.filter(
             user=request.user
         ).order_by('-created_at')
 
-        serializer = RewardHistorySerializer(history, many=True)
-        return Response(serializer.data)
+        return Response(RewardHistoryRowSerializer(history).data)
     except Exception:
         logger.exception("Error in reward_history", extra={'user_id': getattr(request.user, 'id', None)})
         return Response({'error': 'Failed to load history'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -280,16 +348,23 @@ def reward_history(request):
                 format=openapi.FORMAT_BINARY,   # <-- file input in Swagger
                 description="Product photo",
             ),
+            "upload_id": openapi.Schema(
+                type=openapi.TYPE_STRING,
+                description="Completed resumable upload to use instead of photo",
+            ),
         },
-        required=["points", "payment_method_id", "photo"],
+        required=["points", "payment_method_id"],
     ),
+    manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
     responses={
-        200: "Redemption created successfully",
+        200: "Redemption created successfully: redemption_id and status. The proof photo is staff-only and not linked",
         400: "Invalid request / insufficient points",
     },
 )
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@limit_photo_upload
+@idempotent
 def redeem_points(request):
     """Redeem reward points by selecting a payment method and uploading a proof photo."""
     # Guard: must be authenticated (endpoint currently AllowAny)
@@ -297,53 +372,78 @@ def redeem_points(request):
         logger.warning("Unauthenticated redeem_points attempt")
         return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
 
+    photo_limit = request.photo_limit
+
     try:
-        points_str = request.data.get("points", 0)
+        data = request.data
+        if photo_limit.error:
+            logger.warning("Redemption photo rejected", extra={'user_id': request.user.id, 'reason': photo_limit.error})
+            return Response({'error': photo_limit.error}, status=photo_limit.status_code)
+
+        points_str = data.get("points", 0)
         try:
             points_to_redeem = int(points_str)
         except (TypeError, ValueError):
             logger.warning("Invalid points value", extra={'points': points_str})
             return Response({"error": "Invalid points"}, status=status.HTTP_400_BAD_REQUEST)
 
-        payment_method_id = request.data.get("payment_method_id")
+        payment_method_id = data.get("payment_method_id")
         photo = request.FILES.get("photo")  # <-- uploaded file
 
+        # Photo sent earlier through the resumable upload endpoints
+        upload = None
+        upload_id = data.get("upload_id")
+        if photo is None and upload_id:
+            upload = ResumableUpload.get(upload_id, request.user.id)
+            if upload is None or not upload.complete:
+                logger.warning("Redemption upload missing or incomplete", extra={'upload_id': upload_id})
+                return Response({"error": "Upload not found or incomplete"}, status=status.HTTP_400_BAD_REQUEST)
+            photo = upload.as_file()
+
         if not payment_method_id or photo is None:
             logger.warning("Missing fields for redemption", extra={'payment_method_id': payment_method_id, 'has_photo': photo is not None})
             return Response({"error": "Missing required fields"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # total earned points
-        total_points = (
-            RewardHistory.objects.filter(user=request.user).aggregate(
-                total=Sum("points_earned")
-            )["total"]
-            or 0
-        )
-
-        # check if user has enough points
-        if points_to_redeem > total_points:
-            logger.info("Insufficient points for redemption", extra={'user_id': getattr(request.user, 'id', None), 'requested': points_to_redeem, 'available': total_points})
-            return Response(
-                {"error": "Insufficient points"}, status=status.HTTP_400_BAD_REQUEST
-            )
+        if points_to_redeem <= 0:
+            logger.warning("Non-positive redemption points", extra={'points': points_to_redeem})
+            return Response({"error": "Invalid points"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # check if payment method exists
+        # check if payment method exists and belongs to the user
         try:
-            payment_method = PaymentOption.objects.get(id=payment_method_id)
-        except PaymentOption.DoesNotExist:
+            payment_method = PaymentOption.objects.get(id=payment_method_id, user=request.user)
+        except (PaymentOption.DoesNotExist, ValueError):
             logger.warning("Invalid payment method for redemption", extra={'payment_method_id': payment_method_id})
             return Response(
                 {"error": "Invalid payment method"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        # create redemption request
-        redemption = RedemptionRequest.objects.create(
-            user=request.user,
-            points=points_to_redeem,
-            payment_method=payment_method,
-            status="pending",
-            photo=photo,
-        )
+        ensure_balance(request.user.id)
+        try:
+            with transaction.atomic():
+                # create redemption request
+                redemption = RedemptionRequest.objects.create(
+                    user=request.user,
+                    points=points_to_redeem,
+                    payment_method=payment_method,
+                    status="pending",
+                    photo=photo,
+                )
+                # Last statement before commit, so the balance row is locked only briefly
+                if not debit_points(request.user.id, points_to_redeem):
+                    raise InsufficientPoints
+        except InsufficientPoints:
+            redemption.photo.delete(save=False)
+            if upload is not None:
+                photo.close()
+                upload.discard()
+            logger.info("Insufficient points for redemption", extra={'user_id': getattr(request.user, 'id', None), 'requested': points_to_redeem})
+            return Response(
+                {"error": "Insufficient points"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if upload is not None:
+            photo.close()
+            upload.discard()
+        schedule_redemption_photo(redemption.id)
         logger.info("Redemption request created", extra={'user_id': getattr(request.user, 'id', None), 'redemption_id': redemption.id})
 
         return Response(
@@ -351,7 +451,7 @@ def redeem_points(request):
                 "success": True,
                 "redemption_id": redemption.id,
                 "status": redemption.status,
-                "photo_url": redemption.photo.url if redemption.photo else None,
+                # No photo URLs: redemption photos are served to staff only
             },
             status=status.HTTP_200_OK,
         )
@@ -362,22 +462,94 @@ def redeem_points(request):
 
 
 
+@swagger_auto_schema(
+    method="post",
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'size': openapi.Schema(type=openapi.TYPE_INTEGER, description="Total photo size in bytes"),
+            'content_type': openapi.Schema(type=openapi.TYPE_STRING, description="Photo MIME type"),
+            'filename': openapi.Schema(type=openapi.TYPE_STRING, description="Original file name"),
+        },
+        required=['size'],
+    ),
+    responses={201: "Upload created", 400: "Bad Request", 413: "Photo too large"},
+)
+@api_view(['POST'])
+def create_photo_upload(request):
+    """Start a resumable photo upload; the bytes follow in PATCH requests to /api/uploads/<upload_id>/."""
+    try:
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid size'}, status=status.HTTP_400_BAD_REQUEST)
+        if size <= 0:
+            return Response({'error': 'Invalid size'}, status=status.HTTP_400_BAD_REQUEST)
+        if size > settings.REDEMPTION_PHOTO_MAX_BYTES:
+            return Response({'error': 'Photo too large'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        content_type = request.data.get('content_type') or 'image/jpeg'
+        if not content_type.startswith('image/'):
+            return Response({'error': 'Photo must be an image'}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = ResumableUpload.create(request.user.id, size, content_type, request.data.get('filename'))
+        logger.info("Photo upload started", extra={'user_id': request.user.id, 'upload_id': upload.upload_id, 'size': size})
+        return Response(upload.to_dict(), status=status.HTTP_201_CREATED)
+    except Exception:
+        logger.exception("Error creating photo upload", extra={'user_id': getattr(request.user, 'id', None)})
+        return Response({'error': 'Failed to create upload'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET', 'PATCH'])
+def photo_upload(request, upload_id):
+    """
+    GET reports how many bytes have arrived. PATCH appends the raw request
+    body at the Upload-Offset header, which must equal the current offset.
+    """
+    try:
+        upload = ResumableUpload.get(upload_id, request.user.id)
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if request.method == 'GET':
+            return Response(upload.to_dict())
+
+        try:
+            offset = int(request.headers.get('Upload-Offset'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Upload-Offset header required'}, status=status.HTTP_400_BAD_REQUEST)
+        if offset != upload.offset:
+            # Client and server disagree after a dropped connection: tell it where to resume
+            return Response(upload.to_dict(), status=status.HTTP_409_CONFLICT)
+
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if offset + content_length > upload.size:
+            return Response({'error': 'Chunk exceeds declared size'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        # The offset is checked again under the file lock, against a concurrent PATCH
+        if content_length and upload.append(request.stream, content_length, expected_offset=offset) is None:
+            return Response(upload.to_dict(), status=status.HTTP_409_CONFLICT)
+        return Response(upload.to_dict())
+    except Exception:
+        logger.exception("Error in photo_upload", extra={'upload_id': upload_id})
+        return Response({'error': 'Upload failed'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['GET'])
+@user_data_conditional
 def dashboard(request):
     try:
-        total_points = RewardHistory.objects.filter(
+        total_points = (RewardHistory.objects.filter(
             user=request.user
-        ).aggregate(total=Sum('points_earned'))['total'] or 0
+        ).aggregate(total=Sum('points_earned'))['total'] or 0) + archived_points(request.user.id)
 
         recent_activity = RewardHistory.objects.filter(
             user=request.user
         ).order_by('-created_at')[:5]
 
-        serializer = RewardHistorySerializer(recent_activity, many=True)
-
         return Response({
             'total_points': total_points,
-            'recent_activity': serializer.data
+            'recent_activity': RewardHistoryRowSerializer(recent_activity).data
         })
     except Exception:
         logger.exception("Error in dashboard", extra={'user_id': getattr(request.user, 'id', None)})
@@ -400,6 +572,7 @@ def delete_account(request):
         password = request.data.get('password')
         uid = getattr(request.user, 'id', None)
         request.user.delete()
+        invalidate_user_state(uid)
         logger.info("Account deleted", extra={'user_id': uid})
         return Response({'message': 'Account deleted successfully'})
     except Exception:
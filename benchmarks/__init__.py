@@ -0,0 +1,43 @@
+"""
+Benchmark suites, run with ``python manage.py benchmark <suite>``.
+
+Each module in this package registers one or more suites with ``@suite``.
+Suites that touch the ORM run against a throwaway test database.
+"""
+import time
+
+SUITES = {}
+
+
+def suite(name, needs_db=True):
+    """Register ``func(report, iterations)`` as a benchmark suite."""
+    def register(func):
+        SUITES[name] = (func, needs_db)
+        return func
+    return register
+
+
+def run_timed(func, iterations):
+    """Call func() iterations times and return the elapsed wall time in seconds."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return time.perf_counter() - started
+
+
+class Report:
+    def __init__(self, stdout, style):
+        self.stdout = stdout
+        self.style = style
+
+    def section(self, title):
+        self.stdout.write("")
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+
+    def line(self, text):
+        self.stdout.write(f"  {text}")
+
+    def rate(self, label, elapsed, count, unit="op"):
+        per_second = count / elapsed if elapsed else float("inf")
+        per_op_us = elapsed / count * 1e6 if count else 0.0
+        self.stdout.write(f"  {label:<44} {per_second:>12,.0f} {unit}/s {per_op_us:>10.1f} us/{unit}")
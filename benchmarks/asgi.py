@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import path
+
+from apis import async_views, views
+from apis.authentication import tokens_for_user
+from benchmarks import suite
+from rewards.models import Product, ProductQRCode, RewardHistory, User
+
+# Both variants side by side so one run can compare them
+urlpatterns = [
+    path('sync/reward-summary/', views.reward_summary),
+    path('sync/reward-history/', views.reward_history),
+    path('sync/dashboard/', views.dashboard),
+    path('async/reward-summary/', async_views.reward_summary),
+    path('async/reward-history/', async_views.reward_history),
+    path('async/dashboard/', async_views.dashboard),
+]
+
+CONCURRENCY_LEVELS = (1, 8, 32)
+
+
+def _percentiles(latencies):
+    latencies = sorted(latencies)
+    return tuple(latencies[min(int(len(latencies) * pct), len(latencies) - 1)] * 1000 for pct in (0.5, 0.95))
+
+
+def _wsgi_run(url, headers, concurrency, total):
+    local = threading.local()
+
+    def one(_):
+        client = getattr(local, 'client', None) or Client()
+        local.client = client
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        latencies = list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - started
+        list(pool.map(lambda _: connections.close_all(), range(concurrency)))
+    return elapsed, latencies
+
+
+async def _asgi_run(url, headers, concurrency, total):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    # The views' ORM calls ran on the sync_to_async thread; its connection would
+    # otherwise stay open and hold SQLite locks the next suite needs
+    await sync_to_async(connections.close_all)()
+    return elapsed, latencies
+
+
+@suite("asgi")
+def asgi(report, iterations):
+    """Sync views on a WSGI thread pool vs async views on the ASGI handler."""
+    user = User.objects.create(phone="8000000000", city="Pune", profession="Painter")
+    product = Product.objects.create(name="Benchmark paint", points=25)
+    for _ in range(20):
+        qr = ProductQRCode.objects.create(product=product, status="redeemed", redeemed_by=user)
+        RewardHistory.objects.create(user=user, product=product, qr_code=qr, points_earned=product.points)
+    headers = {'Authorization': f"Bearer {tokens_for_user(user).access_token}"}
+
+    with override_settings(ROOT_URLCONF='benchmarks.asgi'):
+        for endpoint in ('reward-summary', 'dashboard', 'reward-history'):
+            report.line(f"/{endpoint}/ ({iterations} requests)")
+            for concurrency in CONCURRENCY_LEVELS:
+                elapsed, latencies = _wsgi_run(f'/sync/{endpoint}/', headers, concurrency, iterations)
+                p50, p95 = _percentiles(latencies)
+                report.rate(f"WSGI threads={concurrency:<3} p50={p50:.1f}ms p95={p95:.1f}ms", elapsed, iterations, "req")
+
+                elapsed, latencies = asyncio.run(_asgi_run(f'/async/{endpoint}/', headers, concurrency, iterations))
+                p50, p95 = _percentiles(latencies)
+                report.rate(f"ASGI tasks={concurrency:<3}   p50={p50:.1f}ms p95={p95:.1f}ms", elapsed, iterations, "req")
@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from benchmarks import suite
+from rewards.balances import InsufficientPoints, credit_points, debit_points, ensure_balance
+from rewards.models import (
+    PaymentOption, Product, ProductQRCode, RedemptionRequest, RewardHistory, User, qr_code_digest,
+)
+
+USERS = 200
+THREADS = 16
+
+# The composite indexes the scan / redeem / summary paths rely on
+INDEXES = (
+    (ProductQRCode, "qrcode_product_status_idx"),
+    (RewardHistory, "rewardhistory_user_created_idx"),
+    (RedemptionRequest, "redemption_user_status_idx"),
+)
+
+PROFILES = {
+    # What settings.DATABASES used before: rollback journal, deferred BEGIN, 5s timeout, no composite indexes
+    "default": {
+        "indexes": False,
+        "options": {"timeout": 5, "init_command": "PRAGMA journal_mode=DELETE;PRAGMA synchronous=FULL"},
+    },
+    "tuned": {"indexes": True, "options": None},
+}
+
+
+def _set_indexes(enabled):
+    with connection.schema_editor() as editor:
+        for model, name in INDEXES:
+            index = next(index for index in model._meta.indexes if index.name == name)
+            if enabled:
+                editor.add_index(model, index)
+            else:
+                editor.remove_index(model, index)
+
+
+def _apply_profile(profile, tuned_options):
+    # Worker threads open their connections from this same settings dict
+    if connection.vendor == "sqlite":
+        options = tuned_options if profile["options"] is None else profile["options"]
+        connection.settings_dict["OPTIONS"] = dict(options)
+    connections.close_all()
+
+
+def _seed(prefix, codes):
+    product = Product.objects.create(name=f"db_writes {prefix}", points=10)
+    users = User.objects.bulk_create(User(phone=f"{prefix}{n:06d}") for n in range(USERS))
+    PaymentOption.objects.bulk_create(
+        PaymentOption(user=user, type="upi", upi_id=f"{user.phone}@upi") for user in users
+    )
+    # Codes are never read back here, so skip the per-row encryption of ProductQRCode.save()
+    ProductQRCode.objects.bulk_create(
+        (ProductQRCode(product=product, code=f"{prefix}-{n}", code_digest=qr_code_digest(f"{prefix}-{n}"))
+         for n in range(codes)),
+        batch_size=500,
+    )
+    code_ids = list(ProductQRCode.objects.filter(product=product).values_list("id", flat=True))
+    payments = dict(PaymentOption.objects.filter(user__in=users).values_list("user_id", "id"))
+    return product, [user.id for user in users], payments, code_ids
+
+
+def _worker(product, user_ids, payments, next_code, ops, results, seed):
+    rng = random.Random(seed)
+    done = errors = 0
+    for _ in range(ops):
+        user_id = rng.choice(user_ids)
+        action = rng.random()
+        try:
+            if action < 0.6:
+                # scan_qr_code: flip the code, record the reward and credit the balance
+                code_id = next_code()
+                with transaction.atomic():
+                    if ProductQRCode.objects.filter(pk=code_id, status="unused").update(
+                        status="redeemed", redeemed_by_id=user_id, redeemed_at=timezone.now()
+                    ):
+                        RewardHistory.objects.create(
+                            user_id=user_id, product=product, qr_code_id=code_id, points_earned=product.points
+                        )
+                        credit_points(user_id, product.points)
+            elif action < 0.8:
+                # redeem_points: write the request, then debit the balance
+                ensure_balance(user_id)
+                try:
+                    with transaction.atomic():
+                        RedemptionRequest.objects.create(user_id=user_id, points=10, payment_method_id=payments[user_id])
+                        if not debit_points(user_id, 10):
+                            raise InsufficientPoints
+                except InsufficientPoints:
+                    pass
+            else:
+                # reward_summary: read only
+                RewardHistory.objects.filter(user_id=user_id).aggregate(total=Sum("points_earned"))
+                RedemptionRequest.objects.filter(user_id=user_id, status="pending").aggregate(total=Sum("points"))
+            done += 1
+        except OperationalError:
+            errors += 1
+    connections.close_all()
+    results.append((done, errors))
+
+
+@suite("db_writes")
+def db_writes(report, iterations):
+    """Concurrent scan/redeem/summary mix through the models, before and after the index and pragma changes."""
+    ops = max(iterations // THREADS, 1)
+    report.line(f"{THREADS} threads x {ops} ops (60% scan, 20% redeem, 20% summary) on {connection.vendor}")
+    if connection.vendor != "sqlite":
+        report.line("not SQLite: profiles differ only in the composite indexes")
+
+    tuned_options = dict(connection.settings_dict["OPTIONS"])
+    indexes = True
+    try:
+        for prefix, (name, profile) in enumerate(PROFILES.items(), start=7):
+            if profile["indexes"] != indexes:
+                _set_indexes(profile["indexes"])
+                indexes = profile["indexes"]
+            _apply_profile(profile, tuned_options)
+            product, user_ids, payments, code_ids = _seed(str(prefix), THREADS * ops)
+
+            counter = iter(code_ids)
+            lock = threading.Lock()
+
+            def next_code():
+                with lock:
+                    return next(counter)
+
+            results = []
+            threads = [
+                threading.Thread(target=_worker, args=(product, user_ids, payments, next_code, ops, results, n))
+                for n in range(THREADS)
+            ]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            done = sum(d for d, _ in results)
+            errors = sum(e for _, e in results)
+            report.rate(f"{name:<8} ({errors} 'database is locked' failures)", elapsed, done, "txn")
+    finally:
+        if not indexes:
+            _set_indexes(True)
+        connection.settings_dict["OPTIONS"] = tuned_options
+        connections.close_all()
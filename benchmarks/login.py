@@ -0,0 +1,83 @@
+import itertools
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apis.authentication import tokens_for_user
+from apis.views import verify_otp
+from benchmarks import run_timed, suite
+from rewards.models import User
+
+_phones = itertools.count(7000000000)
+
+
+def _pem_pair(private_key):
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return private_pem, public_pem
+
+
+def _legacy_login(phone):
+    # verify_otp before the single-upsert path: get_or_create, then a second save for new users
+    user, created = User.objects.get_or_create(phone=phone)
+    if created:
+        user.is_phone_verified = True
+        user.save()
+    refresh = RefreshToken.for_user(user)
+    return str(refresh), str(refresh.access_token)
+
+
+def _login(phone):
+    user, _ = User.objects.verify_phone(phone)
+    refresh = tokens_for_user(user)
+    return str(refresh), str(refresh.access_token)
+
+
+@suite("login")
+def login(report, iterations):
+    """verify_otp throughput; every figure is single-threaded, i.e. per core."""
+    report.line("user upsert + token pair, new users")
+    report.rate("legacy get_or_create + save", run_timed(lambda: _legacy_login(str(next(_phones))), iterations), iterations, "login")
+    report.rate("single upsert", run_timed(lambda: _login(str(next(_phones))), iterations), iterations, "login")
+
+    report.line("user upsert + token pair, returning user")
+    returning = str(next(_phones))
+    _login(returning)
+    report.rate("legacy", run_timed(lambda: _legacy_login(returning), iterations), iterations, "login")
+    report.rate("single upsert", run_timed(lambda: _login(returning), iterations), iterations, "login")
+
+    report.line("full verify_otp view (OTP check, upsert, signing, rendering)")
+    factory = APIRequestFactory()
+
+    def view_login():
+        phone = str(next(_phones))
+        cache.set(f"otp_{phone}", "1234", timeout=300)
+        request = factory.post('/api/verify-otp/', {'phone': phone, 'otp': '1234'}, format='json')
+        response = verify_otp(request)
+        response.render()
+
+    report.rate(f"verify_otp ({settings.SIMPLE_JWT['ALGORITHM']})", run_timed(view_login, iterations), iterations, "login")
+
+    report.line("token signing / verification by algorithm (keys prepared once)")
+    user = User.objects.get(phone=returning)
+    payload = tokens_for_user(user).payload
+    keys = {
+        "HS256": (settings.SECRET_KEY, ""),
+        "RS256": _pem_pair(rsa.generate_private_key(public_exponent=65537, key_size=2048)),
+        "ES256": _pem_pair(ec.generate_private_key(ec.SECP256R1())),
+        "EdDSA": _pem_pair(ed25519.Ed25519PrivateKey.generate()),
+    }
+    for algorithm, (signing_key, verifying_key) in keys.items():
+        backend = TokenBackend(algorithm, signing_key, verifying_key or None)
+        token = backend.encode(payload)
+        report.rate(f"{algorithm} sign", run_timed(lambda: backend.encode(payload), iterations), iterations, "token")
+        report.rate(f"{algorithm} verify", run_timed(lambda: backend.decode(token), iterations), iterations, "token")
@@ -0,0 +1,73 @@
+import base64
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.test import override_settings
+
+from benchmarks import run_timed, suite
+from rewards.models import Product, ProductQRCode
+from rewards.qr_payload import new_code, parse_code, qr_payload
+
+BENCH_SIGNING_KEY = "benchmark-signing-key"
+
+
+def _render(payload):
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    buffer = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
+    return qr.version, base64.b64encode(buffer.getvalue())
+
+
+@suite("qr_payload", needs_db=False)
+def qr_payloads(report, iterations):
+    """QR version, render time and image size of each printed payload format (generate_qr_code's settings)."""
+    plain_code = str(uuid.uuid4())
+    with override_settings(QR_SIGNING_KEY=BENCH_SIGNING_KEY):
+        signed_code = new_code(1)
+    loops = max(iterations // 100, 1)
+    cases = [
+        ("uuid", settings.QR_BASE_URL, plain_code),
+        ("compact", settings.QR_BASE_URL, plain_code),
+        # What a short domain buys on top of the compact code
+        ("compact", "https://rp.example", plain_code),
+        ("compact, signed", settings.QR_BASE_URL, signed_code),
+    ]
+    for label, base_url, code in cases:
+        with override_settings(QR_BASE_URL=base_url):
+            payload = qr_payload(code, label.split(",")[0])
+        version, data_uri = _render(payload)
+        modules = 17 + 4 * version
+        report.line(f"{label}: {payload}")
+        report.line(f"{len(payload)} chars, version {version}, {modules}x{modules} modules, {len(data_uri):,} bytes as base64 PNG")
+        report.rate("render to data URI", run_timed(lambda: _render(payload), loops), loops, "code")
+
+
+@suite("qr_verify")
+def qr_verify(report, iterations):
+    """Cost of turning away a bogus code: signature check vs. the digest lookup unsigned codes need."""
+    # Suites share one database, so keep names and codes apart from the other suites' rows
+    product = Product.objects.create(name="qr_verify product", points=10)
+    try:
+        ProductQRCode.objects.bulk_create(
+            ProductQRCode(product=product, code=f"qr_verify-{n}", code_digest=uuid.uuid4().bytes * 2)
+            for n in range(10000)
+        )
+        bogus_uuid = str(uuid.uuid4())
+        with override_settings(QR_SIGNING_KEY=BENCH_SIGNING_KEY):
+            signed = new_code(product.id)
+            forged = signed[:-1] + ("A" if signed[-1] != "A" else "B")
+            assert parse_code(signed) and parse_code(forged) is None
+            report.rate("forged signed code, parse_code", run_timed(lambda: parse_code(forged), iterations), iterations, "code")
+        report.rate(
+            "unknown uuid, parse_code + lookup",
+            run_timed(lambda: ProductQRCode.objects.for_code(parse_code(bogus_uuid)).exists(), iterations),
+            iterations, "code",
+        )
+    finally:
+        # Deleting the product cascades to its codes
+        product.delete()
@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import OperationalError, connections, transaction
+from django.db.models import Sum
+
+from benchmarks import suite
+from rewards.balances import InsufficientPoints, debit_points, ensure_balance, get_balance
+from rewards.models import PaymentOption, Product, ProductQRCode, RedemptionRequest, RewardHistory, User
+
+THREADS = 32
+POINTS = 10
+BALANCE = 1000
+
+
+def _seed(phone):
+    user = User.objects.create(phone=phone)
+    product = Product.objects.create(name=f"Stress product {phone}", points=BALANCE)
+    code = ProductQRCode.objects.create(product=product)
+    RewardHistory.objects.create(user=user, product=product, qr_code=code, points_earned=BALANCE)
+    payment = PaymentOption.objects.create(user=user, type="upi", upi_id=f"{phone}@upi")
+    return user, payment
+
+
+def _legacy_redeem(user, payment, hold_times):
+    # redeem_points before the balance row: SUM check, then insert, nothing locked
+    earned = RewardHistory.objects.filter(user=user).aggregate(total=Sum("points_earned"))["total"] or 0
+    if POINTS > earned:
+        return False
+    RedemptionRequest.objects.create(user=user, points=POINTS, payment_method=payment)
+    return True
+
+
+def _redeem(user, payment, hold_times):
+    try:
+        with transaction.atomic():
+            RedemptionRequest.objects.create(user=user, points=POINTS, payment_method=payment)
+            debited = time.perf_counter()
+            if not debit_points(user.id, POINTS):
+                raise InsufficientPoints
+        hold_times.append(time.perf_counter() - debited)
+        return True
+    except InsufficientPoints:
+        return False
+
+
+def _run(redeem, user, payment, attempts):
+    hold_times = []
+    busy = []
+
+    def one(_):
+        # A write that can't get the database lock is retried, as a client would
+        while True:
+            try:
+                return redeem(user, payment, hold_times)
+            except OperationalError:
+                busy.append(1)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(one, range(attempts)))
+        elapsed = time.perf_counter() - started
+        list(pool.map(lambda _: connections.close_all(), range(THREADS)))
+    return sum(results), elapsed, hold_times, len(busy)
+
+
+@suite("redeem_stress")
+def redeem_stress(report, iterations):
+    """Parallel redemptions against one balance: count overdrafts, lock hold time."""
+    attempts = max(iterations, 3 * BALANCE // POINTS)
+    report.line(f"{attempts} x {POINTS}-point redemptions from {THREADS} threads, balance {BALANCE}")
+
+    for label, redeem, phone in (
+        ("SUM check, no lock (before)", _legacy_redeem, "6000000001"),
+        ("conditional balance UPDATE", _redeem, "6000000002"),
+    ):
+        user, payment = _seed(phone)
+        ensure_balance(user.id)
+        accepted, elapsed, hold_times, busy = _run(redeem, user, payment, attempts)
+        redeemed = RedemptionRequest.objects.filter(user=user).aggregate(total=Sum("points"))["total"] or 0
+        overdraft = max(redeemed - BALANCE, 0)
+        report.line(
+            f"{label:<30} accepted {accepted:>4}  redeemed {redeemed:>6}  overdraft {overdraft:>6}  "
+            f"busy retries {busy}  {attempts / elapsed:,.0f} attempts/s"
+        )
+        if hold_times:
+            hold_times.sort()
+            p50 = hold_times[len(hold_times) // 2] * 1e6
+            p99 = hold_times[min(int(len(hold_times) * 0.99), len(hold_times) - 1)] * 1e6
+            report.line(f"{'':<30} balance {get_balance(user.id)}, lock held p50 {p50:.0f} us, p99 {p99:.0f} us")
@@ -0,0 +1,51 @@
+from rest_framework.renderers import JSONRenderer
+
+from apis.renderers import ORJSONRenderer
+from apis.serializers import (
+    PaymentOptionRowSerializer, PaymentOptionSerializer, RewardHistoryRowSerializer, RewardHistorySerializer,
+)
+from benchmarks import run_timed, suite
+from rewards.models import PaymentOption, Product, ProductQRCode, RewardHistory, User, qr_code_digest
+
+ROWS = 200
+
+
+def _seed():
+    user = User.objects.create(phone="8100000000")
+    product = Product.objects.create(name="Benchmark product", points=10)
+    codes = ProductQRCode.objects.bulk_create(
+        ProductQRCode(product=product, code=f"bench-{n}", code_digest=qr_code_digest(f"bench-{n}")) for n in range(ROWS)
+    )
+    RewardHistory.objects.bulk_create(
+        RewardHistory(user=user, product=product, qr_code=code, points_earned=10) for code in codes
+    )
+    PaymentOption.objects.bulk_create(
+        PaymentOption(user=user, type="upi", upi_id=f"user{n}@upi") for n in range(ROWS)
+    )
+    return user
+
+
+@suite("serializers")
+def serializers(report, iterations):
+    """Per-row cost of list endpoints: query + serialize + render, before and after."""
+    user = _seed()
+    history = RewardHistory.objects.filter(user=user).order_by("-created_at")
+    payments = PaymentOption.objects.filter(user=user)
+    loops = max(iterations // ROWS, 1)
+
+    cases = {
+        "reward history": (
+            lambda: JSONRenderer().render(
+                RewardHistorySerializer(history.select_related("product"), many=True).data
+            ),
+            lambda: ORJSONRenderer().render(RewardHistoryRowSerializer(history).data),
+        ),
+        "payment methods": (
+            lambda: JSONRenderer().render(PaymentOptionSerializer(payments, many=True).data),
+            lambda: ORJSONRenderer().render(PaymentOptionRowSerializer(payments).data),
+        ),
+    }
+    for name, (before, after) in cases.items():
+        report.line(f"{name}, {ROWS} rows per list")
+        report.rate("ModelSerializer + JSONRenderer", run_timed(before, loops), loops * ROWS, "row")
+        report.rate("values() rows + ORJSONRenderer", run_timed(after, loops), loops * ROWS, "row")
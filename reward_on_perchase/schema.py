@@ -0,0 +1,77 @@
+"""
+OpenAPI schema views. drf_yasg and its spec validators are imported here
+only, and reward_on_perchase.urls loads this module on the first docs
+request instead of at startup.
+
+The schema document only changes with the code, so it is generated once:
+at build time by `manage.py generate_schema` (settings.API_SCHEMA_FILE),
+or otherwise on the first request of each process. Either way it is served
+with an ETag and revalidated rather than rebuilt.
+"""
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+from rewards.media import serve_file
+
+info = openapi.Info(
+    title="Colortex APIs",
+    default_version='v1',
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@yourapi.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+schema_view = get_schema_view(
+    info,
+    public=True,
+    permission_classes=(permissions.AllowAny,),
+)
+
+# The UI pages themselves are cheap (no view introspection); they fetch SPEC_URL
+swagger_ui = schema_view.with_ui('swagger', cache_timeout=0)
+redoc_ui = schema_view.with_ui('redoc', cache_timeout=0)
+
+_lock = threading.Lock()
+_document = None
+
+
+def generate_schema(url=None):
+    """Build the public OpenAPI document as JSON bytes, independent of any request."""
+    generator = OpenAPISchemaGenerator(info, url=url or settings.API_SPEC_URL)
+    schema = generator.get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def get_document():
+    """(content, etag) of the schema, generated on first call in this process."""
+    global _document
+    if _document is None:
+        with _lock:
+            if _document is None:
+                content = generate_schema()
+                _document = (content, '"%s"' % hashlib.sha256(content).hexdigest()[:32])
+    return _document
+
+
+def schema_json(request):
+    if os.path.isfile(settings.API_SCHEMA_FILE):
+        return serve_file(request, settings.API_SCHEMA_FILE, content_type='application/json', cache_control='no-cache')
+
+    content, etag = get_document()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
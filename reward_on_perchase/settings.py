@@ -14,6 +14,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 from .logging_config import LOGGING as PROJECT_LOGGING
 
@@ -23,6 +24,9 @@ load_dotenv(BASE_DIR / ".env")
 
 # Use the key
 ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
+# Key rotation: comma-separated Fernet keys, newest first. New values are encrypted with
+# the first; all of them decrypt. Run `manage.py rotate_encryption_key` after adding one.
+ENCRYPTION_KEYS = [key.strip() for key in os.getenv("ENCRYPTION_KEYS", "").split(",") if key.strip()] or [ENCRYPTION_KEY]
 SECRET_KEY = os.getenv("SECRET_KEY")
 DEBUG = os.getenv("DEBUG", "False").lower() in ("true", "1", "yes")
 
@@ -83,16 +87,64 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'reward_on_perchase.wsgi.application'
 
+# Serve the read-heavy API views and the QR status page with async views.
+# asgi.py turns this on; under WSGI the sync views avoid the async_to_sync hop.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False").lower() in ("true", "1", "yes")
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE selects the backend profile: "sqlite" (default) or "postgresql".
+
+# WAL lets readers run alongside the single writer; the rest trades fsyncs and
+# memory for throughput. Applied on every new SQLite connection.
+SQLITE_INIT_COMMAND = (
+    "PRAGMA journal_mode=WAL;"
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA mmap_size=268435456;"
+    "PRAGMA cache_size=-65536;"
+    "PRAGMA temp_store=MEMORY"
+)
+
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite").lower()
+
+if DB_ENGINE in ("postgres", "postgresql"):
+    # DB_POOL uses psycopg's connection pool (needs psycopg[pool]); otherwise
+    # connections persist per worker for DB_CONN_MAX_AGE seconds.
+    DB_POOL = os.getenv("DB_POOL", "False").lower() in ("true", "1", "yes")
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv("DB_NAME", "reward_on_perchase"),
+            'USER': os.getenv("DB_USER", ""),
+            'PASSWORD': os.getenv("DB_PASSWORD", ""),
+            'HOST': os.getenv("DB_HOST", ""),
+            'PORT': os.getenv("DB_PORT", ""),
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv("DB_CONN_MAX_AGE", "600")),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+                    'max_size': int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Wait for the write lock instead of failing with "database is locked"
+                'timeout': int(os.getenv("SQLITE_TIMEOUT", "20")),
+                # Take the write lock at BEGIN so read-then-write transactions can't deadlock
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': SQLITE_INIT_COMMAND,
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -114,6 +166,53 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache
+# OTPs, JWT user state and API ETag versions live here; with more than one worker
+# process set REDIS_URL so they are shared (the local-memory default is per process).
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# ETag and catalog version tokens never expire in a shared cache (Redis). LocMem is per
+# process and can't see other workers' bumps, so there they expire after this many seconds.
+LOCAL_VERSION_TIMEOUT = int(os.getenv("LOCAL_VERSION_TIMEOUT", "5"))
+
+# Server-side cached pages: the mobile info pages, and the public QR status page
+# (keyed by code hash and dropped when the code is redeemed)
+STATIC_PAGE_CACHE_TIMEOUT = int(os.getenv("STATIC_PAGE_CACHE_TIMEOUT", str(60 * 60 * 24)))
+QR_STATUS_CACHE_TIMEOUT = int(os.getenv("QR_STATUS_CACHE_TIMEOUT", str(60 * 60)))
+
+# Dashboard filter autocomplete: results per query, and how long a user search is cached
+AUTOCOMPLETE_LIMIT = int(os.getenv("AUTOCOMPLETE_LIMIT", "20"))
+AUTOCOMPLETE_CACHE_TIMEOUT = int(os.getenv("AUTOCOMPLETE_CACHE_TIMEOUT", "60"))
+
+# What printed QR codes encode. "uuid": <QR_BASE_URL>/redeem/<uuid>/. "compact": <QR_BASE_URL>/R/<26-char base32>,
+# upper-cased so the whole URL fits QR alphanumeric mode (keep QR_BASE_URL to scheme and host). Both are always accepted.
+QR_BASE_URL = os.getenv("QR_BASE_URL", "http://192.168.1.9:8000")
+QR_PAYLOAD_FORMAT = os.getenv("QR_PAYLOAD_FORMAT", "uuid")
+# When set, new codes carry a truncated HMAC over (product id, serial) under this key, so forged or
+# mistyped codes are rejected without a database lookup. Changing it invalidates every signed code printed.
+QR_SIGNING_KEY = os.getenv("QR_SIGNING_KEY", "")
+
+# Redeemed codes (and their RewardHistory) older than this move to the archive tables with
+# `manage.py archive_redeemed_codes`; the public status page still finds them there
+QR_ARCHIVE_AFTER_DAYS = int(os.getenv("QR_ARCHIVE_AFTER_DAYS", "180"))
+
+# How long scan / redeem responses are kept for replay to retries with the same Idempotency-Key
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", str(60 * 60 * 24)))
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -147,22 +246,59 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = "rewards.User"
 
 
+# Build request.user from signed token claims instead of querying User on every API call
+JWT_STATELESS_AUTH = os.getenv("JWT_STATELESS_AUTH", "True").lower() in ("true", "1", "yes")
+# How long a user's active/staff state is trusted before it is re-read (catches revocation)
+JWT_USER_STATE_CACHE_TIMEOUT = int(os.getenv("JWT_USER_STATE_CACHE_TIMEOUT", "60"))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apis.authentication.ClaimsJWTAuthentication' if JWT_STATELESS_AUTH
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'apis.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'apis.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
+# Token signing. HS256 signs with SECRET_KEY. Asymmetric algorithms (RS256, ES256, EdDSA)
+# read PEM keys once here so other services can verify tokens with the public key alone.
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+JWT_SIGNING_KEY_FILE = os.getenv("JWT_SIGNING_KEY_FILE")
+JWT_VERIFYING_KEY_FILE = os.getenv("JWT_VERIFYING_KEY_FILE")
+
+
+def _read_jwt_key(setting, path):
+    try:
+        return Path(path).read_text()
+    except OSError as e:
+        raise ImproperlyConfigured(f"{setting}={path!r} can't be read for JWT_ALGORITHM={JWT_ALGORITHM}: {e}") from e
+
+
+# Fail at startup, not at the first login, if an asymmetric algorithm has no usable keys
+if JWT_ALGORITHM.startswith(("RS", "ES", "PS", "EdDSA")):
+    if not (JWT_SIGNING_KEY_FILE and JWT_VERIFYING_KEY_FILE):
+        raise ImproperlyConfigured(
+            f"JWT_ALGORITHM={JWT_ALGORITHM} needs JWT_SIGNING_KEY_FILE and JWT_VERIFYING_KEY_FILE (PEM files)"
+        )
+elif not JWT_ALGORITHM.startswith("HS"):
+    raise ImproperlyConfigured(f"Unsupported JWT_ALGORITHM={JWT_ALGORITHM}")
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=90),
     'ROTATE_REFRESH_TOKENS': True,
+    'ALGORITHM': JWT_ALGORITHM,
+    'SIGNING_KEY': _read_jwt_key("JWT_SIGNING_KEY_FILE", JWT_SIGNING_KEY_FILE) if JWT_SIGNING_KEY_FILE else SECRET_KEY,
+    'VERIFYING_KEY': _read_jwt_key("JWT_VERIFYING_KEY_FILE", JWT_VERIFYING_KEY_FILE) if JWT_VERIFYING_KEY_FILE else "",
 }
 
 SWAGGER_SETTINGS = {
@@ -175,7 +311,18 @@ SWAGGER_SETTINGS = {
     }
     },
     'USE_SESSION_AUTH': False, # Disable Django session login button
+    # The UIs load the cached document instead of regenerating it per page view
+    'SPEC_URL': 'schemajson',
 }
+REDOC_SETTINGS = {
+    'SPEC_URL': 'schemajson',
+}
+
+# OpenAPI document written by `manage.py generate_schema` at build time; when the file
+# is missing the schema is generated once per process on the first request.
+API_SCHEMA_FILE = os.getenv("API_SCHEMA_FILE", os.path.join(BASE_DIR, 'openapi.json'))
+# Base URL written into the schema (e.g. https://api.example.com); request-independent
+API_SPEC_URL = os.getenv("API_SPEC_URL") or None
 
 
 CORS_ALLOWED_ORIGINS = [
@@ -185,6 +332,31 @@ CORS_ALLOWED_ORIGINS = [
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", "3600"))
+
+# Let the proxy send media bodies: "x-accel-redirect" (nginx) or "x-sendfile" (Apache/lighttpd).
+# For nginx, map MEDIA_ACCEL_PREFIX to BASE_DIR in an internal location:
+#   location /protected/ { internal; alias /path/to/project/; }
+MEDIA_SENDFILE = os.getenv("MEDIA_SENDFILE", "").lower()
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/protected/")
+
+# Uploads larger than this spool to a temp file beside MEDIA_ROOT, so saving them is a rename.
+# In-progress uploads stay out of MEDIA_ROOT, which is publicly served.
+UPLOAD_TEMP_ROOT = os.path.join(BASE_DIR, 'uploads')
+FILE_UPLOAD_TEMP_DIR = os.path.join(UPLOAD_TEMP_ROOT, 'tmp')
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+# Redemption proof photos: upload cap, then downscaled/recompressed off the request path
+REDEMPTION_PHOTO_MAX_BYTES = int(os.getenv("REDEMPTION_PHOTO_MAX_BYTES", str(10 * 1024 * 1024)))
+REDEMPTION_PHOTO_MAX_DIMENSION = int(os.getenv("REDEMPTION_PHOTO_MAX_DIMENSION", "1600"))
+REDEMPTION_PHOTO_QUALITY = int(os.getenv("REDEMPTION_PHOTO_QUALITY", "82"))
+PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", "2"))
+
+# Thumbnail / WebP variants of product images and redemption photos, built on first request
+THUMBNAIL_ROOT = os.path.join(BASE_DIR, 'media_cache')
+THUMBNAIL_WIDTHS = (64, 160, 400, 800)
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
 
 # SMS Configuration
 SMS_API_KEY = 'your_sms_api_key'
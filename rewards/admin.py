@@ -1,11 +1,162 @@
 from django.contrib import admin
-from .models import ProductCategory, Product, ProductQRCode, User, RewardHistory, PaymentOption,RedemptionRequest
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from .models import ProductCategory, Product, ProductQRCode, User, RewardHistory, PaymentOption,RedemptionRequest, ArchivedQRCode, ArchivedRewardHistory
+from .payouts import approve_requests, reject_requests
+from .qr_payload import parse_code
+
+# Below this many rows an exact COUNT(*) is cheap enough to keep
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    On PostgreSQL, pages an unfiltered changelist with the planner's row
+    estimate instead of a COUNT(*) over the whole table. Filtered lists
+    are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist defaults for tables with millions of rows: no full counts, newest first by primary key."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ("-id",)
+    list_per_page = 50
+
+
+class ProductIdFilter(admin.SimpleListFilter):
+    """
+    Filter by a typed product id. The default related-field filter renders
+    a link for every product in the table on each changelist page.
+    """
+    title = "product id"
+    parameter_name = "product"
+    template = "admin/rewards/input_filter.html"
+
+    def lookups(self, request, model_admin):
+        # Non-empty so the filter is shown; the template renders an input box instead
+        return (("", ""),)
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(product_id=int(value))
+        return queryset
+
+    def choices(self, changelist):
+        # Just "All", plus the other active parameters for the form to carry over
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(remove=[self.parameter_name]),
+            "display": _("All"),
+            "other_params": [(key, value) for key, value in changelist.params.items() if key != self.parameter_name],
+        }
+
+
+@admin.register(ProductQRCode)
+class ProductQRCodeAdmin(LargeTableAdmin):
+    # Nothing here decrypts codes or touches __str__; the form shows the lookup digest, not the code
+    list_display = ("id", "product", "status", "redeemed_by", "redeemed_at", "created_at")
+    list_select_related = ("product", "redeemed_by")
+    # status + product use qrcode_product_status_idx
+    list_filter = ("status", ProductIdFilter)
+    search_fields = ("=id",)
+    search_help_text = "Exact id, or a scanned code / URL"
+    raw_id_fields = ("product", "redeemed_by")
+    exclude = ("code",)
+    readonly_fields = ("code_lookup_hash", "redeemed_at", "created_at")
+
+    @admin.display(description="Code digest")
+    def code_lookup_hash(self, obj):
+        return obj.lookup_hash
+
+    def get_search_results(self, request, queryset, search_term):
+        plain_code = parse_code(search_term)
+        if plain_code:
+            # Codes are encrypted; match by lookup digest instead of scanning ciphertexts
+            return queryset.for_code(plain_code), False
+        if not search_term.strip().isdigit():
+            return queryset.none(), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+@admin.register(RewardHistory)
+class RewardHistoryAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "product", "points_earned", "created_at")
+    list_select_related = ("user", "product")
+    list_filter = (ProductIdFilter,)
+    # Exact phone match uses the unique index on User.phone
+    search_fields = ("=user__phone",)
+    raw_id_fields = ("user", "product", "qr_code")
+    # PointsBalance is kept in step with history by rewards.balances; edits here would drift from it
+    readonly_fields = ("user", "points_earned")
+
+    def has_add_permission(self, request):
+        # Rewards come from scans, which credit the balance
+        return False
+
+
+@admin.register(RedemptionRequest)
+class RedemptionRequestAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "points", "status", "payout_batch", "created_at")
+    list_select_related = ("user", "payout_batch")
+    # status uses redemption_status_id_idx
+    list_filter = ("status",)
+    search_fields = ("=user__phone",)
+    raw_id_fields = ("user", "payment_method", "payout_batch")
+    # Status changes go through the actions below, which batch approvals and refund rejections
+    readonly_fields = ("user", "points", "status", "payout_batch", "processed_at")
+    actions = ("approve_selected", "reject_selected")
+
+    def has_add_permission(self, request):
+        # Requests come from redeem_points, which debits the balance
+        return False
+
+    @admin.action(description="Approve selected pending requests")
+    def approve_selected(self, request, queryset):
+        batches = approve_requests(queryset, request.user)
+        approved = sum(batch.request_count for batch in batches)
+        self.message_user(request, f"Approved {approved} requests into {len(batches)} payout batch(es).")
+
+    @admin.action(description="Reject selected pending requests and refund their points")
+    def reject_selected(self, request, queryset):
+        rejected = reject_requests(queryset)
+        self.message_user(request, f"Rejected {rejected} requests.")
+
+
+@admin.register(ArchivedQRCode)
+class ArchivedQRCodeAdmin(LargeTableAdmin):
+    list_display = ("id", "product", "redeemed_by", "redeemed_at", "archived_at")
+    list_select_related = ("product", "redeemed_by")
+    search_fields = ("=id",)
+    raw_id_fields = ("product", "redeemed_by")
+
+
+@admin.register(ArchivedRewardHistory)
+class ArchivedRewardHistoryAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "product", "points_earned", "created_at")
+    list_select_related = ("user", "product")
+    search_fields = ("=user__phone",)
+    raw_id_fields = ("user", "product", "qr_code")
+
 
 # Register your models here.
 admin.site.register(ProductCategory)
 admin.site.register(Product)
-admin.site.register(ProductQRCode)
 admin.site.register(User)
-admin.site.register(RewardHistory)
 admin.site.register(PaymentOption)
-admin.site.register(RedemptionRequest)
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Archival of redeemed QR codes.
+
+Redeemed codes older than QR_ARCHIVE_AFTER_DAYS, and the RewardHistory rows
+that point at them, are moved in id-ordered batches to ArchivedQRCode and
+ArchivedRewardHistory. The hot table and its indexes then hold only codes a
+scan can still claim plus recent history. Lifetime point totals and the
+public status page read both sides.
+"""
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import (
+    ArchivedQRCode, ArchivedRewardHistory, ProductQRCode, RewardHistory, qr_code_digest,
+)
+from .versions import bump_user_versions
+
+CODE_FIELDS = ("id", "product_id", "code", "code_digest", "code_hash", "redeemed_by_id", "redeemed_at", "created_at")
+HISTORY_FIELDS = ("id", "user_id", "product_id", "qr_code_id", "points_earned", "created_at")
+
+
+def _digest(row):
+    if row["code_digest"]:
+        return bytes(row["code_digest"])
+    if row["code_hash"]:
+        return bytes.fromhex(row["code_hash"])
+    return qr_code_digest(ProductQRCode(code=row["code"]).decrypted_code)
+
+
+def archive_batch(cutoff, after_id=0, batch_size=1000):
+    """
+    Move up to batch_size codes redeemed before cutoff with id > after_id.
+    Returns (last id looked at, codes archived); the id is None when there
+    is nothing left.
+    """
+    ids = list(
+        ProductQRCode.objects.filter(id__gt=after_id, status="redeemed", redeemed_at__lt=cutoff)
+        .order_by("id").values_list("id", flat=True)[:batch_size]
+    )
+    if not ids:
+        return None, 0
+
+    with transaction.atomic():
+        codes = list(ProductQRCode.objects.select_for_update().filter(id__in=ids, status="redeemed").values(*CODE_FIELDS))
+        code_ids = [row["id"] for row in codes]
+        histories = list(RewardHistory.objects.filter(qr_code_id__in=code_ids).values(*HISTORY_FIELDS))
+
+        ArchivedQRCode.objects.bulk_create([
+            ArchivedQRCode(
+                id=row["id"], product_id=row["product_id"], code=row["code"], code_digest=_digest(row),
+                redeemed_by_id=row["redeemed_by_id"], redeemed_at=row["redeemed_at"], created_at=row["created_at"],
+            )
+            for row in codes
+        ])
+        ArchivedRewardHistory.objects.bulk_create([ArchivedRewardHistory(**row) for row in histories])
+        RewardHistory.objects.filter(id__in=[row["id"] for row in histories]).delete()
+        ProductQRCode.objects.filter(id__in=code_ids).delete()
+
+        # Totals don't change but the history lists do
+        user_ids = {row["user_id"] for row in histories}
+        transaction.on_commit(lambda: bump_user_versions(user_ids))
+    return ids[-1], len(codes)
+
+
+def archived_status(plain_code):
+    """'redeemed' if the code was archived, else None."""
+    found = ArchivedQRCode.objects.filter(code_digest=qr_code_digest(plain_code)).exists()
+    return ArchivedQRCode.status if found else None
+
+
+async def aarchived_status(plain_code):
+    found = await ArchivedQRCode.objects.filter(code_digest=qr_code_digest(plain_code)).aexists()
+    return ArchivedQRCode.status if found else None
+
+
+def archived_points(user_id):
+    return ArchivedRewardHistory.objects.filter(user_id=user_id).aggregate(total=Sum("points_earned"))["total"] or 0
+
+
+async def aarchived_points(user_id):
+    return (await ArchivedRewardHistory.objects.filter(user_id=user_id).aaggregate(total=Sum("points_earned")))["total"] or 0
@@ -0,0 +1,81 @@
+"""
+Per-user points balance.
+
+Every change is a single conditional UPDATE on the user's PointsBalance row,
+so the row lock is held only from that statement to commit, and a debit
+that would overdraw matches no row instead of racing a separate SUM check.
+Users who predate the balance table get their row computed from their
+history the first time it is needed.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import ArchivedRewardHistory, PointsBalance, RedemptionRequest, RewardHistory
+
+
+class InsufficientPoints(Exception):
+    pass
+
+
+def _computed_balance(user_id):
+    earned = RewardHistory.objects.filter(user_id=user_id).aggregate(total=Sum("points_earned"))["total"] or 0
+    earned += ArchivedRewardHistory.objects.filter(user_id=user_id).aggregate(total=Sum("points_earned"))["total"] or 0
+    spent = RedemptionRequest.objects.filter(
+        user_id=user_id, status__in=("pending", "approved")
+    ).aggregate(total=Sum("points"))["total"] or 0
+    return max(earned - spent, 0)
+
+
+def _create_balance(user_id):
+    """Create the row from history; False if another transaction created it first."""
+    try:
+        with transaction.atomic():
+            PointsBalance.objects.create(user_id=user_id, available=_computed_balance(user_id))
+        return True
+    except IntegrityError:
+        return False
+
+
+def ensure_balance(user_id):
+    """Create the user's balance row from their history if it doesn't exist yet."""
+    if not PointsBalance.objects.filter(user_id=user_id).exists():
+        _create_balance(user_id)
+
+
+def get_balance(user_id):
+    ensure_balance(user_id)
+    return PointsBalance.objects.filter(user_id=user_id).values_list("available", flat=True).get()
+
+
+def credit_points(user_id, points):
+    """Add points for a scan. Call after writing the history row, in the same transaction."""
+    if PointsBalance.objects.filter(user_id=user_id).update(available=F("available") + points):
+        return
+    # A row computed by us already counts the new history row; one created
+    # concurrently couldn't see it, so the points still have to be added
+    if not _create_balance(user_id):
+        PointsBalance.objects.filter(user_id=user_id).update(available=F("available") + points)
+
+
+def debit_points(user_id, points):
+    """
+    Take points if the user has them; returns False instead of overdrawing.
+    Call ensure_balance() before creating the redemption the debit pays for.
+    """
+    return bool(
+        PointsBalance.objects.filter(user_id=user_id, available__gte=points).update(
+            available=F("available") - points
+        )
+    )
+
+
+def refund_redemptions(redemption_ids):
+    """Give back the points of the given (just rejected) redemptions, one UPDATE for all users."""
+    refunds = RedemptionRequest.objects.filter(
+        pk__in=redemption_ids, user_id=OuterRef("user_id")
+    ).values("user_id").annotate(total=Sum("points")).values("total")
+    user_ids = RedemptionRequest.objects.filter(pk__in=redemption_ids).values("user_id")
+    PointsBalance.objects.filter(user_id__in=user_ids).update(
+        available=F("available") + Coalesce(Subquery(refunds), 0)
+    )
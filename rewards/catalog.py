@@ -0,0 +1,54 @@
+"""
+In-process product catalog for the scan path.
+
+Each process keeps every product's scan-relevant fields in memory, tagged
+with the catalog version from rewards.versions. The version is replaced
+after any Product save or delete, so a process reloads the catalog on the
+next lookup after a change instead of querying products on every scan.
+With a shared cache that is every process; with LocMem the other workers
+reload once the token expires (LOCAL_VERSION_TIMEOUT). A product missing
+from the snapshot is read from the database.
+"""
+import threading
+from collections import namedtuple
+
+from .versions import catalog_version
+
+ProductInfo = namedtuple("ProductInfo", ["id", "name", "points", "category_id", "is_active"])
+
+_lock = threading.Lock()
+_products = {}
+_version = None
+
+
+def _load():
+    from .models import Product
+
+    return {
+        row[0]: ProductInfo(*row)
+        for row in Product.objects.values_list("id", "name", "points", "category_id", "is_active")
+    }
+
+
+def get_catalog():
+    """Return {product_id: ProductInfo}, reloading if the catalog version moved."""
+    global _products, _version
+    version = catalog_version()
+    if version != _version:
+        with _lock:
+            if version != _version:
+                _products = _load()
+                _version = version
+    return _products
+
+
+def get_product(product_id):
+    """ProductInfo for one product, or None if it doesn't exist (callers must handle None)."""
+    product = get_catalog().get(product_id)
+    if product is None:
+        # Created since the last reload but its version bump isn't visible yet
+        from .models import Product
+
+        row = Product.objects.filter(pk=product_id).values_list(*ProductInfo._fields).first()
+        product = ProductInfo(*row) if row else None
+    return product
@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from rewards.archive import archive_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Move redeemed QR codes older than QR_ARCHIVE_AFTER_DAYS, with their reward history, "
+        "to the archive tables in id-ordered batches. Safe to stop and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Archive codes redeemed more than this many days ago")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Codes moved per transaction")
+        parser.add_argument("--sleep", type=float, default=0.05, help="Pause between batches, in seconds")
+
+    def handle(self, *args, **options):
+        days = settings.QR_ARCHIVE_AFTER_DAYS if options["days"] is None else options["days"]
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        cutoff = timezone.now() - timedelta(days=days)
+
+        last_id = 0
+        archived = 0
+        while True:
+            last_id, moved = archive_batch(cutoff, last_id, options["batch_size"])
+            if last_id is None:
+                break
+            archived += moved
+            self.stdout.write(f"up to id {last_id}: {archived:,} archived")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {archived:,} codes redeemed before {cutoff:%Y-%m-%d} archived."))
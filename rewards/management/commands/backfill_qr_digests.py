@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from rewards.models import ProductQRCode, qr_code_digest
+
+
+class Command(BaseCommand):
+    help = (
+        "Move QR code lookup hashes from the hex code_hash column into the binary code_digest column, "
+        "in id-ordered chunks. Safe to stop and re-run; converted rows are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows converted per transaction")
+        parser.add_argument("--sleep", type=float, default=0.05, help="Pause between chunks, in seconds")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        pending = ProductQRCode.objects.filter(code_digest__isnull=True)
+        last_id = 0
+        converted = 0
+        while True:
+            rows = list(pending.filter(id__gt=last_id).order_by("id").only("id", "code", "code_hash")[:chunk_size])
+            if not rows:
+                break
+            for row in rows:
+                # Rows from before the hash column existed only have the ciphertext
+                row.code_digest = bytes.fromhex(row.code_hash) if row.code_hash else qr_code_digest(row.decrypted_code)
+                row.code_hash = None
+            with transaction.atomic():
+                ProductQRCode.objects.bulk_update(rows, ["code_digest", "code_hash"], batch_size=1000)
+
+            converted += len(rows)
+            last_id = rows[-1].id
+            self.stdout.write(f"up to id {last_id}: {converted:,} converted")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {converted:,} rows converted."))
@@ -0,0 +1,65 @@
+import importlib
+import logging
+import os
+import pkgutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+import benchmarks
+from benchmarks import SUITES, Report
+
+
+def load_suites():
+    for module in pkgutil.iter_modules(benchmarks.__path__):
+        importlib.import_module(f"benchmarks.{module.name}")
+    return SUITES
+
+
+class Command(BaseCommand):
+    help = "Run benchmark suites from the benchmarks package. Suites using the ORM run on a throwaway test database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("suites", nargs="*", help="Suites to run (default: all)")
+        parser.add_argument("--iterations", type=int, default=1000, help="Iterations per measurement")
+        parser.add_argument("--list", action="store_true", help="List available suites and exit")
+
+    def handle(self, *args, **options):
+        suites = load_suites()
+        if options["list"]:
+            for name in sorted(suites):
+                self.stdout.write(name)
+            return
+
+        names = options["suites"] or sorted(suites)
+        unknown = [name for name in names if name not in suites]
+        if unknown:
+            raise CommandError(f"Unknown suite(s): {', '.join(unknown)}. Available: {', '.join(sorted(suites))}")
+
+        report = Report(self.stdout, self.style)
+        needs_db = any(suites[name][1] for name in names)
+        if needs_db:
+            setup_test_environment(debug=False)
+            tmp_dir = tempfile.TemporaryDirectory()
+            for alias in connections:
+                db = connections[alias].settings_dict
+                # A file-backed SQLite test database, so concurrent suites see the
+                # real locking (busy timeout, WAL) rather than shared-cache memory
+                if db["ENGINE"] == "django.db.backends.sqlite3" and not db["TEST"].get("NAME"):
+                    db["TEST"]["NAME"] = os.path.join(tmp_dir.name, f"{alias}.sqlite3")
+            old_config = setup_databases(verbosity=0, interactive=False)
+        # Request logging would dominate the timings
+        logging.disable(logging.CRITICAL)
+        try:
+            for name in names:
+                func, _ = suites[name]
+                report.section(f"[{name}]")
+                func(report, options["iterations"])
+        finally:
+            logging.disable(logging.NOTSET)
+            if needs_db:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+                tmp_dir.cleanup()
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker imports before serving its first request
+BOOT_SCRIPT = """
+import django
+django.setup()
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+for module in {modules!r}:
+    __import__(module)
+"""
+
+
+def parse_importtime(stderr):
+    """Return [(module, self_us, cumulative_us, depth)] from python -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Measure worker startup: import cost of a fresh process booting the project, by package and module."
+
+    def add_arguments(self, parser):
+        parser.add_argument("modules", nargs="*", help="Extra modules to import after boot")
+        parser.add_argument("--top", type=int, default=20, help="Rows to show per table")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+        env.setdefault("DJANGO_SETTINGS_MODULE", os.environ.get("DJANGO_SETTINGS_MODULE", "reward_on_perchase.settings"))
+        script = BOOT_SCRIPT.format(modules=options["modules"])
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", script],
+            env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Boot failed:\n{result.stderr[-2000:]}")
+
+        rows = parse_importtime(result.stderr)
+        total = sum(self_us for _, self_us, _, _ in rows)
+        by_package = defaultdict(int)
+        for name, self_us, _, _ in rows:
+            by_package[name.split(".")[0]] += self_us
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Startup imports: {len(rows)} modules, {total / 1000:.1f} ms"))
+        self.stdout.write("")
+        self.stdout.write(self.style.MIGRATE_HEADING("By top-level package (self time)"))
+        for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:options["top"]]:
+            self.stdout.write(f"  {package:<40} {us / 1000:>8.1f} ms {us / total:>6.1%}")
+
+        self.stdout.write("")
+        self.stdout.write(self.style.MIGRATE_HEADING("Slowest modules (cumulative, first import)"))
+        top_level = [row for row in rows if row[3] == 0]
+        for name, _, cumulative_us, _ in sorted(top_level, key=lambda row: -row[2])[:options["top"]]:
+            self.stdout.write(f"  {name:<52} {cumulative_us / 1000:>8.1f} ms")
@@ -0,0 +1,100 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from rewards.models import ProductQRCode
+from utils.crypto import build_cipher
+
+_worker_state = {}
+
+
+def _init_worker(keys):
+    from cryptography.fernet import Fernet
+    _worker_state["cipher"] = build_cipher(keys)
+    _worker_state["primary"] = Fernet(keys[0])
+
+
+def _rotate_batch(rows):
+    """Re-encrypt rows not already under the primary key; returns [(id, code)] to write."""
+    from cryptography.fernet import InvalidToken
+
+    cipher = _worker_state["cipher"]
+    primary = _worker_state["primary"]
+    changed = []
+    for pk, code in rows:
+        token = code.encode()
+        try:
+            # Only the HMAC check runs for a foreign key, so skipping done rows is cheap
+            primary.decrypt(token)
+            continue
+        except InvalidToken:
+            pass
+        changed.append((pk, cipher.rotate(token).decode()))
+    return changed
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encrypt ProductQRCode.code under the first key in ENCRYPTION_KEYS. Walks the table in id order "
+        "in short transactions and can be stopped and resumed at any time; rows already under the new key "
+        "are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows read and written per transaction")
+        parser.add_argument("--workers", type=int, default=None, help="Crypto processes (default: CPU count)")
+        parser.add_argument("--sleep", type=float, default=0.05, help="Pause between chunks, in seconds, to leave room for scans")
+        parser.add_argument("--start-after", type=int, default=0, help="Resume after this id (printed as progress)")
+        parser.add_argument("--dry-run", action="store_true", help="Count rows that need rotating without writing")
+
+    def handle(self, *args, **options):
+        keys = settings.ENCRYPTION_KEYS
+        if len(keys) < 2:
+            self.stdout.write(self.style.WARNING("Only one key configured; rows already under it will be skipped."))
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        # Workers never touch the database; don't hand them an open connection
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker, initargs=(keys,))
+        workers = pool._max_workers
+
+        last_id = options["start_after"]
+        scanned = rotated = 0
+        started = time.perf_counter()
+        try:
+            while True:
+                rows = list(
+                    ProductQRCode.objects.filter(id__gt=last_id).order_by("id").values_list("id", "code")[:chunk_size]
+                )
+                if not rows:
+                    break
+
+                step = -(-len(rows) // workers)
+                batches = [rows[i:i + step] for i in range(0, len(rows), step)]
+                changed = [row for batch in pool.map(_rotate_batch, batches) for row in batch]
+
+                if changed and not options["dry_run"]:
+                    with transaction.atomic():
+                        ProductQRCode.objects.bulk_update(
+                            [ProductQRCode(pk=pk, code=code) for pk, code in changed], ["code"], batch_size=500
+                        )
+
+                scanned += len(rows)
+                rotated += len(changed)
+                last_id = rows[-1][0]
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"up to id {last_id}: {scanned:,} scanned, {rotated:,} re-encrypted, {scanned / elapsed:,.0f} rows/s"
+                )
+                if options["sleep"]:
+                    time.sleep(options["sleep"])
+        finally:
+            pool.shutdown()
+
+        verb = "need re-encrypting" if options["dry_run"] else "re-encrypted"
+        self.stdout.write(self.style.SUCCESS(f"Done: {scanned:,} rows scanned, {rotated:,} {verb}."))
@@ -0,0 +1,136 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Paths relative to MEDIA_ROOT. Product imagery may sit in shared caches;
+# redemption proof photos are for staff only.
+PUBLIC_MEDIA_PREFIXES = ("media/products/",)
+STAFF_MEDIA_PREFIXES = ("redemptions/",)
+
+
+class FileRange:
+    """
+    A byte range of an open file. Exposes fileno() and leaves the file offset
+    at the range start, so a WSGI server's file_wrapper (gunicorn, uWSGI)
+    can sendfile() it using Content-Length as the byte count; read() is the
+    bounded fallback for servers without zero-copy support.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def media_name(name):
+    """Normalise a MEDIA_ROOT-relative name so prefix checks can't be side-stepped with '..'."""
+    return os.path.normpath(name).replace(os.sep, "/").lstrip("/")
+
+
+def is_staff_media(name):
+    return media_name(name).startswith(STAFF_MEDIA_PREFIXES)
+
+
+def media_cache_control(name, max_age=None):
+    """Cache-Control for an uploaded file: public only for product imagery."""
+    max_age = settings.MEDIA_CACHE_MAX_AGE if max_age is None else max_age
+    visibility = "public" if media_name(name).startswith(PUBLIC_MEDIA_PREFIXES) else "private"
+    return f"{visibility}, max-age={max_age}"
+
+
+def file_etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """Return (start, end) for a single satisfiable byte range, None to serve the whole file, or False if unsatisfiable."""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Malformed and multi-range requests get the full body
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        return None
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def serve_file(request, path, content_type=None, cache_control=None):
+    """
+    Serve a file from disk with ETag/Last-Modified validation and byte
+    ranges. With MEDIA_SENDFILE set, the body is left to the proxy through
+    X-Accel-Redirect (nginx) or X-Sendfile (Apache/lighttpd).
+    """
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    def set_validators(response):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        response["Cache-Control"] = cache_control or f"private, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return set_validators(not_modified)
+
+    content_type = content_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    if settings.MEDIA_SENDFILE == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + os.path.relpath(path, settings.BASE_DIR).replace(os.sep, "/")
+        return set_validators(response)
+    if settings.MEDIA_SENDFILE == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+        return set_validators(response)
+
+    byte_range = None
+    range_header = request.headers.get("Range")
+    if range_header and request.headers.get("If-Range", etag) == etag:
+        byte_range = parse_range(range_header, stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return response
+
+    file = open(path, "rb")
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(FileRange(file, start, end - start + 1), status=206, content_type=content_type)
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    else:
+        response = FileResponse(file, content_type=content_type)
+    response["Accept-Ranges"] = "bytes"
+    return set_validators(response)
@@ -2,12 +2,13 @@ import base64
 from io import BytesIO
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-import qrcode
 from django.core.files.base import ContentFile
-from django.db import models
+from django.db import connections, models, router
+from django.db.models.constants import OnConflict
 from django.conf import settings
-import uuid
+from django.utils import timezone
 from utils.crypto import encrypt_text, decrypt_text
+from .qr_payload import new_code, qr_payload
 import hashlib
 
 
@@ -27,6 +28,32 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault("is_superuser", True)
         return self.create_user(phone, password, **extra_fields)
 
+    def verify_phone(self, phone):
+        """
+        Return (user, created) for a phone that just passed OTP, marking it
+        verified. One INSERT ... ON CONFLICT DO UPDATE ... RETURNING where the
+        database supports it, so new and returning users both cost one query.
+        """
+        db = self._db or router.db_for_write(self.model)
+        opts = self.model._meta
+        if not (connections[db].features.supports_update_conflicts_with_target
+                and connections[db].features.can_return_rows_from_bulk_insert):
+            return self.db_manager(db).get_or_create(phone=phone, defaults={"is_phone_verified": True})
+
+        user = self.model(phone=phone, is_phone_verified=True, date_joined=timezone.now())
+        fields = opts.concrete_fields
+        rows = self.db_manager(db).get_queryset()._insert(
+            [user],
+            fields=[f for f in fields if not f.primary_key],
+            returning_fields=fields,
+            on_conflict=OnConflict.UPDATE,
+            update_fields=[opts.get_field("is_phone_verified")],
+            unique_fields=[opts.get_field("phone")],
+        )
+        stored = self.model.from_db(db, [f.attname for f in fields], rows[0])
+        # An existing row keeps the date_joined of its first login
+        return stored, stored.date_joined == user.date_joined
+
 
 # Custom User Model (Phone only, no username/email)
 class User(AbstractUser):
@@ -46,6 +73,52 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.phone}"
 
+    @property
+    def profile_complete(self) -> bool:
+        claimed = getattr(self, "_claimed_profile_complete", None)
+        if claimed is not None and {"city", "profession"} & self.get_deferred_fields():
+            return claimed
+        return bool(self.city and self.profession)
+
+    # Columns a claims-built user takes from the token rather than the row
+    TOKEN_FIELDS = ("phone", "is_active", "is_staff", "is_superuser")
+
+    @classmethod
+    def from_token_claims(cls, user_id, claims, is_active):
+        """
+        Build a user from signed JWT claims without querying; other columns
+        stay deferred. is_active comes from the authenticator's cached user
+        state, not the token, so deactivation is seen before the token expires.
+        """
+        known = {
+            "id": user_id,
+            "phone": claims["phone"],
+            "is_active": is_active,
+            "is_staff": claims["is_staff"],
+            "is_superuser": claims["is_superuser"],
+        }
+        # from_db expects values in concrete field order
+        field_names = [f.attname for f in cls._meta.concrete_fields if f.attname in known]
+        user = cls.from_db(cls.objects.db, field_names, [known[name] for name in field_names])
+        user._claimed_profile_complete = claims["profile_complete"]
+        return user
+
+    def save(self, *args, **kwargs):
+        # Token-derived columns may be stale; a claims-built user never writes them back implicitly
+        if hasattr(self, "_claimed_profile_complete") and kwargs.get("update_fields") is None:
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                f.attname for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in self.TOKEN_FIELDS and f.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # A claims-built user loads all its deferred columns together on first access
+        if fields is not None and hasattr(self, "_claimed_profile_complete"):
+            fields = set(fields) | self.get_deferred_fields()
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
 
 # Payment Options (Bank / UPI)
 class PaymentOption(models.Model):
@@ -93,6 +166,18 @@ class Product(models.Model):
         return self.name
 
 
+def qr_code_digest(plain_code: str) -> bytes:
+    """SHA-256 of a plain QR code, the value its row is looked up by."""
+    return hashlib.sha256(plain_code.encode()).digest()
+
+
+class ProductQRCodeQuerySet(models.QuerySet):
+    def for_code(self, plain_code):
+        digest = qr_code_digest(plain_code)
+        # Rows not yet converted by backfill_qr_digests only carry the hex hash
+        return self.filter(models.Q(code_digest=digest) | models.Q(code_hash=digest.hex()))
+
+
 # QR Code Model
 class ProductQRCode(models.Model):
     STATUS_CHOICES = (
@@ -101,8 +186,9 @@ class ProductQRCode(models.Model):
     )
 
     product = models.ForeignKey("Product", on_delete=models.CASCADE, related_name="qrcodes")
-    code = models.TextField(unique=True)  # stores ENCRYPTED value
-    code_hash = models.CharField(max_length=64, unique=True, editable=False, default="")  # SHA256 for lookup
+    code = models.TextField()  # stores ENCRYPTED value; rows are found by code_digest
+    code_digest = models.BinaryField(max_length=32, unique=True, null=True, editable=False)  # raw SHA256 for lookup
+    code_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)  # legacy hex SHA256, cleared by backfill_qr_digests
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="unused")
     redeemed_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -114,21 +200,39 @@ class ProductQRCode(models.Model):
     redeemed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Dashboard list / print filters by product and status, newest first
+            models.Index(fields=["product", "status", "created_at"], name="qrcode_product_status_idx"),
+            # Only unconverted rows stay indexed by hex hash; shrinks to nothing after the backfill
+            models.Index(fields=["code_hash"], name="qrcode_legacy_hash_idx", condition=models.Q(code_hash__isnull=False)),
+        ]
+
+    objects = ProductQRCodeQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         if not self.code:  # first save
-            raw_uuid = str(uuid.uuid4())
-            self.code = encrypt_text(raw_uuid)
-            self.code_hash = hashlib.sha256(raw_uuid.encode()).hexdigest()
+            plain_code = new_code(self.product_id)
+            self.code = encrypt_text(plain_code)
+            self.code_digest = qr_code_digest(plain_code)
         super().save(*args, **kwargs)
 
+    @property
+    def lookup_hash(self) -> str:
+        """Hex SHA256 of the plain code, as used in cache keys."""
+        return bytes(self.code_digest).hex() if self.code_digest else self.code_hash
+
     @property
     def decrypted_code(self) -> str:
         """Return decrypted code on demand."""
         return decrypt_text(self.code)
 
-    def generate_qr_code(self):
+    def generate_qr_code(self, fmt=None):
         """Generate a QR code embedding the decrypted value in the URL."""
-        redemption_url = f"http://192.168.1.9:8000/redeem/{self.decrypted_code}/"
+        # Only the dashboard print views render QR images; keep qrcode/PIL out of worker startup
+        import qrcode
+
+        redemption_url = qr_payload(self.decrypted_code, fmt)
 
         qr = qrcode.QRCode(
             version=1,
@@ -157,10 +261,74 @@ class RewardHistory(models.Model):
     points_earned = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Per-user totals and newest-first history
+            models.Index(fields=["user", "created_at"], name="rewardhistory_user_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.phone} earned {self.points_earned} points"
 
 
+# Cold storage for redeemed codes and their rewards, moved out of the hot tables by
+# rewards.archive once they are older than QR_ARCHIVE_AFTER_DAYS. Rows keep their ids.
+class ArchivedQRCode(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey("Product", on_delete=models.SET_NULL, null=True, related_name="+")
+    code = models.TextField()  # ENCRYPTED value, as in ProductQRCode
+    code_digest = models.BinaryField(max_length=32, unique=True)
+    redeemed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="+")
+    redeemed_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    # Only redeemed codes are archived
+    status = "redeemed"
+
+    @property
+    def decrypted_code(self) -> str:
+        return decrypt_text(self.code)
+
+    def __str__(self):
+        return f"Archived code {self.pk}"
+
+
+class ArchivedRewardHistory(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="archived_reward_history")
+    product = models.ForeignKey("Product", on_delete=models.SET_NULL, null=True, related_name="+")
+    qr_code = models.OneToOneField(ArchivedQRCode, on_delete=models.CASCADE, related_name="reward_history")
+    points_earned = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} earned {self.points_earned} points (archived)"
+
+
+# Spendable points per user: earned minus pending and approved redemptions.
+# Maintained by rewards.balances with conditional UPDATEs; the column can't go negative.
+class PointsBalance(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="points_balance")
+    available = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.available} points"
+
+
+# A set of approved redemptions paid out together through one payment rail
+class PayoutBatch(models.Model):
+    payment_type = models.CharField(max_length=10, choices=PaymentOption.PAYMENT_CHOICES)
+    request_count = models.PositiveIntegerField(default=0)
+    total_points = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="payout_batches")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Batch {self.pk} - {self.payment_type} - {self.request_count} requests"
+
+
 class RedemptionRequest(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -172,8 +340,17 @@ class RedemptionRequest(models.Model):
     payment_method = models.ForeignKey(PaymentOption, on_delete=models.CASCADE)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     photo = models.ImageField(upload_to="redemptions/", blank=True, null=True)  # <-- added field
+    payout_batch = models.ForeignKey(PayoutBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name="requests")
+    processed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "status"], name="redemption_user_status_idx"),
+            # Dashboard queue: keyset pages of one status, oldest first
+            models.Index(fields=["status", "id"], name="redemption_status_id_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.phone} - {self.points} points - {self.status}"
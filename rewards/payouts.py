@@ -0,0 +1,119 @@
+"""
+Bulk processing of redemption requests.
+
+Approving or rejecting N requests is one UPDATE per payment type (plus one
+balance refund UPDATE on rejection), not N saves; approved requests are attached to a PayoutBatch per type, whose
+payout file is streamed row by row from the database.
+"""
+import csv
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .balances import refund_redemptions
+from .models import PayoutBatch, RedemptionRequest
+from .versions import bump_user_versions
+
+# Columns of the payout file for each payment type: (header, values() lookup)
+PAYOUT_COLUMNS = {
+    "upi": [
+        ("Request ID", "id"),
+        ("Phone", "user__phone"),
+        ("UPI ID", "payment_method__upi_id"),
+        ("Holder Name", "payment_method__holder_name"),
+        ("Points", "points"),
+        ("Requested At", "created_at"),
+    ],
+    "bank": [
+        ("Request ID", "id"),
+        ("Phone", "user__phone"),
+        ("Holder Name", "payment_method__holder_name"),
+        ("Bank Account", "payment_method__bank_account"),
+        ("IFSC Code", "payment_method__ifsc_code"),
+        ("Points", "points"),
+        ("Requested At", "created_at"),
+    ],
+}
+
+
+def approve_requests(requests, approved_by):
+    """
+    Approve the pending requests in the queryset, one PayoutBatch per payment
+    type. Requests no longer pending are skipped. Returns the new batches.
+    """
+    now = timezone.now()
+    pending = requests.filter(status="pending")
+    batches = []
+    with transaction.atomic():
+        user_ids = list(pending.values_list("user_id", flat=True).distinct())
+        totals = pending.values("payment_method__type").annotate(count=Count("id"), points=Sum("points"))
+        for row in totals:
+            payment_type = row["payment_method__type"]
+            batch = PayoutBatch.objects.create(payment_type=payment_type, created_by=approved_by)
+            updated = pending.filter(payment_method__type=payment_type).update(
+                status="approved", payout_batch=batch, processed_at=now, updated_at=now,
+            )
+            if not updated:
+                # Another admin took every row since the totals were read: no empty batch
+                batch.delete()
+                continue
+            # Another admin may have taken some rows since the totals were read
+            if updated != row["count"]:
+                row = batch.requests.aggregate(count=Count("id"), points=Sum("points"))
+            batch.request_count = row["count"]
+            batch.total_points = row["points"] or 0
+            batch.save(update_fields=["request_count", "total_points"])
+            batches.append(batch)
+        # Bulk updates skip the model signals that version the users' API data
+        transaction.on_commit(lambda: bump_user_versions(user_ids))
+    return batches
+
+
+def reject_requests(requests):
+    """Reject the pending requests in the queryset and refund their points; returns how many changed."""
+    now = timezone.now()
+    with transaction.atomic():
+        # Lock the rows so exactly the requests rejected here are refunded
+        pending = requests.filter(status="pending").select_for_update()
+        rows = list(pending.values_list("id", "user_id"))
+        ids = [pk for pk, _ in rows]
+        rejected = RedemptionRequest.objects.filter(pk__in=ids).update(
+            status="rejected", processed_at=now, updated_at=now,
+        )
+        refund_redemptions(ids)
+        user_ids = {user_id for _, user_id in rows}
+        transaction.on_commit(lambda: bump_user_versions(user_ids))
+    return rejected
+
+
+# Spreadsheet apps run cells starting with these as formulas
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def csv_safe(value):
+    """Quote a user-supplied text cell so a spreadsheet shows it instead of evaluating it."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class Echo:
+    """File-like object whose write() hands the line back, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def payout_rows(batch):
+    """Yield the CSV lines of a batch's payout file, reading the rows in chunks."""
+    columns = PAYOUT_COLUMNS[batch.payment_type]
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, _ in columns])
+    rows = (
+        batch.requests.order_by("id")
+        .values_list(*(lookup for _, lookup in columns))
+        .iterator(chunk_size=2000)
+    )
+    for row in rows:
+        yield writer.writerow([csv_safe(value) for value in row])
@@ -0,0 +1,59 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger('rewards')
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.PHOTO_WORKERS, thread_name_prefix="photo")
+    return _executor
+
+
+def schedule_redemption_photo(redemption_id):
+    """Downscale and recompress a redemption photo in the worker pool once the row is committed."""
+    transaction.on_commit(lambda: get_executor().submit(process_redemption_photo, redemption_id))
+
+
+def process_redemption_photo(redemption_id):
+    from PIL import Image, ImageOps
+    from rewards.models import RedemptionRequest
+
+    try:
+        redemption = RedemptionRequest.objects.only("photo").get(pk=redemption_id)
+        if not redemption.photo:
+            return
+        path = redemption.photo.path
+        max_side = settings.REDEMPTION_PHOTO_MAX_DIMENSION
+
+        with Image.open(path) as img:
+            image_format = img.format or "JPEG"
+            original_size = os.path.getsize(path)
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_side, max_side))
+            if image_format == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+
+            # Same name and format so the URL already handed to the client stays valid
+            tmp_path = f"{path}.tmp"
+            save_options = {"optimize": True}
+            if image_format in ("JPEG", "WEBP"):
+                save_options["quality"] = settings.REDEMPTION_PHOTO_QUALITY
+            img.save(tmp_path, format=image_format, **save_options)
+
+        if os.path.getsize(tmp_path) < original_size:
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+        logger.info("Redemption photo processed", extra={'redemption_id': redemption_id, 'original_bytes': original_size, 'bytes': os.path.getsize(path)})
+    except Exception:
+        logger.exception("Failed to process redemption photo", extra={'redemption_id': redemption_id})
+    finally:
+        close_old_connections()
@@ -0,0 +1,85 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import secrets
+import struct
+import uuid
+
+from django.conf import settings
+
+# 128 bits in RFC 4648 base32, padding dropped
+COMPACT_LENGTH = 26
+
+# Signed codes: "S" + base32 of product id (4 bytes), random serial (8) and
+# the first 8 bytes of HMAC-SHA256(QR_SIGNING_KEY, product id + serial)
+SIGNED_PREFIX = "S"
+SIGNED_LENGTH = 33
+SIGNED_BODY = struct.Struct(">IQ")
+SIGNED_TAG_BYTES = 8
+
+
+def _signature(body):
+    return hmac.new(settings.QR_SIGNING_KEY.encode(), body, hashlib.sha256).digest()[:SIGNED_TAG_BYTES]
+
+
+def new_code(product_id):
+    """Plain value for a new code: signed when QR_SIGNING_KEY is set, a random UUID otherwise."""
+    if not settings.QR_SIGNING_KEY:
+        return str(uuid.uuid4())
+    body = SIGNED_BODY.pack(product_id, secrets.randbits(64))
+    return SIGNED_PREFIX + base64.b32encode(body + _signature(body)).decode()
+
+
+def unpack_signed(code):
+    """(product_id, serial) of a genuine signed code, or None. No database access."""
+    code = str(code).strip().upper()
+    if len(code) != SIGNED_LENGTH or not code.startswith(SIGNED_PREFIX) or not settings.QR_SIGNING_KEY:
+        return None
+    try:
+        raw = base64.b32decode(code[1:])
+    except (binascii.Error, ValueError):
+        return None
+    body, tag = raw[:SIGNED_BODY.size], raw[SIGNED_BODY.size:]
+    if not hmac.compare_digest(tag, _signature(body)):
+        return None
+    return SIGNED_BODY.unpack(body)
+
+
+def encode_compact(plain_code):
+    """26-char upper-case base32 form of a UUID code; signed codes are already compact."""
+    if plain_code.startswith(SIGNED_PREFIX):
+        return plain_code
+    return base64.b32encode(uuid.UUID(plain_code).bytes).decode()[:COMPACT_LENGTH]
+
+
+def parse_code(value):
+    """
+    Canonical plain code (the string rows are hashed from) for a scanned
+    value: a UUID, a compact code, a signed code, or a URL ending in any of
+    them. Returns None if it is none of these, including signed codes whose
+    signature does not check out.
+    """
+    value = str(value).strip()
+    if "/" in value:
+        value = value.rstrip("/").rsplit("/", 1)[-1]
+    if len(value) == SIGNED_LENGTH:
+        return value.upper() if unpack_signed(value) else None
+    if len(value) == COMPACT_LENGTH:
+        try:
+            return str(uuid.UUID(bytes=base64.b32decode(value.upper() + "======")))
+        except (binascii.Error, ValueError):
+            return None
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        return None
+
+
+def qr_payload(plain_code, fmt=None):
+    """The URL printed in a code's QR image, in QR_PAYLOAD_FORMAT unless fmt is given."""
+    fmt = fmt or settings.QR_PAYLOAD_FORMAT
+    base_url = settings.QR_BASE_URL.rstrip("/")
+    if fmt == "compact":
+        return f"{base_url.upper()}/R/{encode_compact(plain_code)}"
+    return f"{base_url}/redeem/{plain_code}/"
@@ -0,0 +1,81 @@
+import functools
+import hashlib
+import inspect
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+
+from .qr_payload import parse_code
+
+
+def response_cache_key(name, key):
+    return f"response_{name}_{key}"
+
+
+def invalidate_response(name, key):
+    cache.delete(response_cache_key(name, key))
+
+
+def qr_status_key(request, uuid_str):
+    # Both payload formats of a code share one entry, the one scans invalidate
+    return hashlib.sha256((parse_code(uuid_str) or str(uuid_str)).encode()).hexdigest()
+
+
+def cached_response(name, timeout, key_func=None, browser_max_age=None):
+    """
+    Cache a view's successful GET responses server side for `timeout`
+    seconds. key_func(request, *args, **kwargs) picks the cache key
+    (request.path by default), so a view can be invalidated by something it
+    knows, like a code hash. Works on sync and async views. With
+    browser_max_age, responses are also marked publicly cacheable.
+    """
+    key_func = key_func or (lambda request, *args, **kwargs: request.path)
+
+    def cacheable(response):
+        # Views opt a response out (e.g. an error fallback) with never_cache headers
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and 'no-cache' not in response.get('Cache-Control', '')
+        )
+
+    def build(cached):
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+
+    def finish(response):
+        if browser_max_age is not None and response.status_code == 200:
+            patch_cache_control(response, public=True, max_age=browser_max_age)
+        return response
+
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                key = response_cache_key(name, key_func(request, *args, **kwargs))
+                cached = await cache.aget(key)
+                if cached is not None:
+                    return finish(build(cached))
+                response = await view(request, *args, **kwargs)
+                if cacheable(response):
+                    await cache.aset(key, (response.content, response['Content-Type']), timeout)
+                return finish(response)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = response_cache_key(name, key_func(request, *args, **kwargs))
+            cached = cache.get(key)
+            if cached is not None:
+                return finish(build(cached))
+            response = view(request, *args, **kwargs)
+            if cacheable(response):
+                cache.set(key, (response.content, response['Content-Type']), timeout)
+            return finish(response)
+        return wrapper
+    return decorator
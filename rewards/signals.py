@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Product, ProductQRCode, RedemptionRequest, RewardHistory
+from .response_cache import invalidate_response
+from .versions import bump_catalog_version, bump_user_version
+
+
+# Bump after commit, so a concurrent read can never pair the new version with the old rows
+@receiver([post_save, post_delete], sender=RewardHistory)
+@receiver([post_save, post_delete], sender=RedemptionRequest)
+def user_data_changed(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+@receiver([post_save, post_delete], sender=Product)
+def catalog_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=ProductQRCode)
+@receiver(post_delete, sender=ProductQRCode)
+def qr_code_changed(sender, instance, created=False, **kwargs):
+    # New codes can't be cached yet; skipping them keeps bulk generation cheap
+    if created:
+        return
+    lookup_hash = instance.lookup_hash
+    transaction.on_commit(lambda: invalidate_response('qr_status', lookup_hash))
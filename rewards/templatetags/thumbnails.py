@@ -0,0 +1,16 @@
+from django import template
+
+from rewards.thumbnails import variant_url
+
+register = template.Library()
+
+
+@register.filter
+def variant(field_file, width):
+    """{{ product.image|variant:160 }} -> URL of a 160px-wide WebP variant."""
+    return variant_url(field_file, int(width))
+
+
+@register.filter
+def jpeg_variant(field_file, width):
+    return variant_url(field_file, int(width), "jpeg")
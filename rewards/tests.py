@@ -1,3 +1,472 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from utils.crypto import build_cipher
+
+from .archive import archive_batch, archived_points, archived_status
+from .balances import credit_points, debit_points, get_balance
+from .models import (
+    ArchivedQRCode, ArchivedRewardHistory, PaymentOption, PayoutBatch, PointsBalance, Product,
+    ProductQRCode, RedemptionRequest, RewardHistory, User, qr_code_digest,
+)
+from .payouts import approve_requests, reject_requests
+from .qr_payload import SIGNED_LENGTH, encode_compact, new_code, parse_code, qr_payload
+from .views import _user_history_page, _user_stats, media_variant, serve_media
+
+
+class BalanceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(phone="9000000001")
+        self.product = Product.objects.create(name="Balance product", points=10)
+
+    def earn(self, points):
+        code = ProductQRCode.objects.create(product=self.product, status="redeemed")
+        RewardHistory.objects.create(user=self.user, product=self.product, qr_code=code, points_earned=points)
+        credit_points(self.user.id, points)
+
+    def test_balance_computed_from_history(self):
+        code = ProductQRCode.objects.create(product=self.product, status="redeemed")
+        RewardHistory.objects.create(user=self.user, product=self.product, qr_code=code, points_earned=30)
+        payment = PaymentOption.objects.create(user=self.user, type="upi", upi_id="a@upi")
+        RedemptionRequest.objects.create(user=self.user, points=5, payment_method=payment)
+        RedemptionRequest.objects.create(user=self.user, points=7, payment_method=payment, status="rejected")
+
+        self.assertEqual(get_balance(self.user.id), 25)
+
+    def test_credit_creates_missing_row(self):
+        self.earn(10)
+        self.assertEqual(PointsBalance.objects.get(user=self.user).available, 10)
+
+    def test_debit_never_overdraws(self):
+        self.earn(10)
+        self.assertTrue(debit_points(self.user.id, 6))
+        self.assertFalse(debit_points(self.user.id, 6))
+        self.assertEqual(get_balance(self.user.id), 4)
+
+
+class ConcurrentDebitTests(TransactionTestCase):
+    THREADS = 8
+    POINTS = 10
+    BALANCE = 50
+
+    def debit(self, user_id, barrier, results):
+        # Each thread has its own connection and no surrounding transaction, so
+        # nothing but debit_points itself keeps the balance from being overdrawn
+        try:
+            barrier.wait()
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                try:
+                    results.append(debit_points(user_id, self.POINTS))
+                    return
+                except OperationalError:
+                    # The SQLite test database reports lock contention instead of waiting
+                    time.sleep(0.001)
+        finally:
+            connections.close_all()
+
+    def test_parallel_debits_cannot_overdraw(self):
+        user = User.objects.create(phone="9000000004")
+        PointsBalance.objects.create(user=user, available=self.BALANCE)
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+
+        threads = [threading.Thread(target=self.debit, args=(user.id, barrier, results)) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.THREADS)
+        self.assertEqual(results.count(True), self.BALANCE // self.POINTS)
+        self.assertEqual(PointsBalance.objects.get(user=user).available, 0)
+
+
+@override_settings(QR_SIGNING_KEY="test-signing-key", QR_BASE_URL="https://example.com")
+class ParseCodeTests(SimpleTestCase):
+    def test_uuid(self):
+        code = str(uuid.uuid4())
+        self.assertEqual(parse_code(code), code)
+        self.assertEqual(parse_code(f"  {code.upper()} "), code)
+
+    def test_compact(self):
+        code = str(uuid.uuid4())
+        compact = encode_compact(code)
+        self.assertEqual(len(compact), 26)
+        self.assertEqual(parse_code(compact), code)
+        self.assertEqual(parse_code(compact.lower()), code)
+
+    def test_urls(self):
+        code = str(uuid.uuid4())
+        self.assertEqual(parse_code(qr_payload(code, "uuid")), code)
+        self.assertEqual(parse_code(qr_payload(code, "compact")), code)
+        self.assertEqual(parse_code(f"https://example.com/redeem/{code}"), code)
+
+    def test_signed(self):
+        code = new_code(42)
+        self.assertEqual(len(code), SIGNED_LENGTH)
+        self.assertEqual(parse_code(code), code)
+        self.assertEqual(parse_code(code.lower()), code)
+        self.assertEqual(parse_code(qr_payload(code, "compact")), code)
+
+    def test_tampered_signed(self):
+        code = new_code(42)
+        last = "A" if code[-1] != "A" else "B"
+        self.assertIsNone(parse_code(code[:-1] + last))
+        self.assertIsNone(parse_code(code[0] + ("B" if code[1] != "B" else "C") + code[2:]))
+
+    def test_signed_without_key(self):
+        code = new_code(42)
+        with override_settings(QR_SIGNING_KEY=""):
+            self.assertIsNone(parse_code(code))
+
+    def test_garbage(self):
+        for value in ("", "not-a-code", "https://example.com/redeem/", "1" * 26, "S" + "1" * 32):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_code(value))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone="9000000002")
+        self.product = Product.objects.create(name="Archive product", points=15)
+        self.code = ProductQRCode.objects.create(product=self.product)
+        self.plain = self.code.decrypted_code
+        old = timezone.now() - timedelta(days=400)
+        ProductQRCode.objects.filter(pk=self.code.pk).update(status="redeemed", redeemed_by=self.user, redeemed_at=old)
+        RewardHistory.objects.create(user=self.user, product=self.product, qr_code=self.code, points_earned=15)
+        self.recent = ProductQRCode.objects.create(product=self.product)
+
+    def archive(self):
+        return archive_batch(timezone.now() - timedelta(days=180))
+
+    def login_staff(self):
+        staff = User.objects.create(phone="9000000003", is_staff=True)
+        self.client.force_login(staff)
+
+    def test_moves_old_redeemed_codes_only(self):
+        last_id, moved = self.archive()
+
+        self.assertEqual((last_id, moved), (self.code.pk, 1))
+        self.assertFalse(ProductQRCode.objects.filter(pk=self.code.pk).exists())
+        self.assertTrue(ProductQRCode.objects.filter(pk=self.recent.pk).exists())
+        self.assertFalse(RewardHistory.objects.filter(user=self.user).exists())
+        self.assertTrue(ArchivedQRCode.objects.filter(pk=self.code.pk).exists())
+        self.assertEqual(ArchivedRewardHistory.objects.get(user=self.user).points_earned, 15)
+        self.assertEqual(self.archive(), (None, 0))
+
+    def test_lookups_fall_back_to_archive(self):
+        self.archive()
+
+        self.assertEqual(archived_status(self.plain), "redeemed")
+        self.assertIsNone(archived_status(str(uuid.uuid4())))
+        self.assertEqual(archived_points(self.user.id), 15)
+        self.assertEqual(get_balance(self.user.id), 15)
+
+    def test_status_page_reads_archive(self):
+        self.archive()
+
+        response = self.client.get(reverse("qr_code_status", args=[self.plain]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["status"], "redeemed")
+
+    def test_dashboard_counts_archived_codes(self):
+        self.archive()
+        self.login_staff()
+
+        response = self.client.get(reverse("dashboard_home"))
+
+        self.assertEqual(response.context["total_qr_codes"], 2)
+        self.assertEqual(response.context["redeemed_qr_codes"], 1)
+
+    def test_export_includes_archived_rewards(self):
+        self.archive()
+        self.login_staff()
+
+        response = self.client.get(reverse("export_rewards_csv"))
+        rows = response.content.decode().splitlines()
+
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[1].startswith("9000000002,Archive product,15,"))
+
+
+class RotateEncryptionKeyTests(TransactionTestCase):
+    # A TransactionTestCase: the command closes the connections before forking its workers
+    def test_rows_move_to_the_primary_key(self):
+        from cryptography.fernet import Fernet, InvalidToken
+
+        old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+        product = Product.objects.create(name="Rotation product", points=5)
+        plain = {}
+        for n in range(5):
+            code = ProductQRCode.objects.create(product=product)
+            plain[code.pk] = f"code-{n}"
+            ProductQRCode.objects.filter(pk=code.pk).update(code=build_cipher([old_key]).encrypt(f"code-{n}".encode()).decode())
+
+        with override_settings(ENCRYPTION_KEYS=[new_key, old_key]):
+            call_command("rotate_encryption_key", workers=1, sleep=0, chunk_size=2, stdout=io.StringIO())
+
+        for pk, code in ProductQRCode.objects.values_list("id", "code"):
+            self.assertEqual(Fernet(new_key).decrypt(code.encode()).decode(), plain[pk])
+            with self.assertRaises(InvalidToken):
+                Fernet(old_key).decrypt(code.encode())
+
+    def test_old_keys_still_decrypt(self):
+        from cryptography.fernet import Fernet
+
+        old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+        token = build_cipher([old_key]).encrypt(b"legacy")
+
+        self.assertEqual(build_cipher([new_key, old_key]).decrypt(token), b"legacy")
+
+
+class BackfillDigestTests(TestCase):
+    def test_legacy_rows_are_converted(self):
+        product = Product.objects.create(name="Backfill product", points=5)
+        hashed, bare = ProductQRCode.objects.create(product=product), ProductQRCode.objects.create(product=product)
+        ProductQRCode.objects.filter(pk=hashed.pk).update(code_digest=None, code_hash=qr_code_digest(hashed.decrypted_code).hex())
+        ProductQRCode.objects.filter(pk=bare.pk).update(code_digest=None, code_hash=None)
+        # Before the backfill the hex hash still finds the row
+        self.assertEqual(ProductQRCode.objects.for_code(hashed.decrypted_code).get().pk, hashed.pk)
+
+        call_command("backfill_qr_digests", sleep=0, chunk_size=1, stdout=io.StringIO())
+
+        for code in (hashed, bare):
+            row = ProductQRCode.objects.get(pk=code.pk)
+            self.assertIsNone(row.code_hash)
+            self.assertEqual(bytes(row.code_digest), qr_code_digest(code.decrypted_code))
+            self.assertEqual(ProductQRCode.objects.for_code(code.decrypted_code).get().pk, code.pk)
+
+
+@mock.patch("rewards.views.USER_HISTORY_PAGE_SIZE", 3)
+class UserHistoryPagingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone="9000000012")
+        self.product = Product.objects.create(name="History product", points=5)
+        now = timezone.now()
+        for n in range(7):
+            code = ProductQRCode.objects.create(product=self.product, status="redeemed")
+            reward = RewardHistory.objects.create(user=self.user, product=self.product, qr_code=code, points_earned=5)
+            # Pairs of rows share a timestamp, so the cursor has to break ties by id
+            RewardHistory.objects.filter(pk=reward.pk).update(created_at=now - timedelta(minutes=n // 2))
+        self.expected = list(RewardHistory.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+
+    def test_pages_cover_every_row_once(self):
+        seen, before = [], ""
+        while True:
+            page, before = _user_history_page(self.user.id, before)
+            seen.extend(row["id"] for row in page)
+            if before is None:
+                break
+
+        self.assertEqual(seen, self.expected)
+
+    def test_rows_view_continues_from_the_cursor(self):
+        self.client.force_login(User.objects.create(phone="9000000013", is_staff=True))
+        detail = self.client.get(reverse("user_detail", args=[self.user.pk]))
+
+        response = self.client.get(
+            reverse("user_history_rows", args=[self.user.pk]), {"before": detail.context["next_before"]},
+        )
+
+        self.assertEqual([row["id"] for row in detail.context["reward_history"]], self.expected[:3])
+        self.assertEqual([row["id"] for row in response.context["reward_history"]], self.expected[3:6])
+        self.assertEqual(response.context["reward_history"][0]["product_name"], "History product")
+
+    def test_stats_include_archived_rewards(self):
+        RewardHistory.objects.filter(user=self.user).update(created_at=timezone.now() - timedelta(days=400))
+        ProductQRCode.objects.update(redeemed_by=self.user, redeemed_at=timezone.now() - timedelta(days=400))
+        archive_batch(timezone.now() - timedelta(days=180))
+
+        stats = _user_stats(self.user.id)
+
+        self.assertEqual((stats["total_scans"], stats["total_points"], stats["archived_scans"]), (7, 35, 7))
+        self.assertIsNotNone(stats["last_activity"])
+
+
+class PayoutTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create(phone="9000000010", is_staff=True)
+        self.user = User.objects.create(phone="9000000011")
+        PointsBalance.objects.create(user=self.user, available=0)
+        self.upi = PaymentOption.objects.create(user=self.user, type="upi", upi_id="=cmd|' /C calc'!A0", holder_name="+Holder")
+        self.bank = PaymentOption.objects.create(user=self.user, type="bank", bank_account="1", ifsc_code="X", holder_name="Holder")
+
+    def request(self, points, payment, status="pending"):
+        return RedemptionRequest.objects.create(user=self.user, points=points, payment_method=payment, status=status)
+
+    def test_approve_makes_one_batch_per_type(self):
+        self.request(10, self.upi)
+        self.request(20, self.upi)
+        self.request(5, self.bank)
+        self.request(7, self.bank, status="rejected")
+
+        batches = approve_requests(RedemptionRequest.objects.all(), self.staff)
+
+        summary = sorted((b.payment_type, b.request_count, b.total_points) for b in batches)
+        self.assertEqual(summary, [("bank", 1, 5), ("upi", 2, 30)])
+        self.assertEqual(RedemptionRequest.objects.filter(status="rejected").count(), 1)
+        self.assertEqual(approve_requests(RedemptionRequest.objects.all(), self.staff), [])
+        self.assertEqual(PayoutBatch.objects.count(), 2)
+
+    def test_reject_refunds_pending_requests_only(self):
+        self.request(10, self.upi)
+        self.request(20, self.upi, status="approved")
+
+        self.assertEqual(reject_requests(RedemptionRequest.objects.all()), 1)
+        self.assertEqual(reject_requests(RedemptionRequest.objects.all()), 0)
+        self.assertEqual(PointsBalance.objects.get(user=self.user).available, 10)
+
+    def test_payout_csv_neutralises_formulas(self):
+        self.request(10, self.upi)
+        batch, = approve_requests(RedemptionRequest.objects.all(), self.staff)
+        self.client.force_login(self.staff)
+
+        response = self.client.get(reverse("payout_batch_csv", args=[batch.pk]))
+        rows = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+
+        self.assertEqual(rows[0][:3], ["Request ID", "Phone", "UPI ID"])
+        self.assertEqual(rows[1][2:4], ["'=cmd|' /C calc'!A0", "'+Holder"])
+
+    def test_bulk_action_view(self):
+        pending = self.request(10, self.upi)
+        self.client.force_login(self.staff)
+
+        response = self.client.post(reverse("redemption_bulk_action"), {"action": "approve", "ids": [pending.pk]})
+
+        self.assertEqual(response.status_code, 302)
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, "approved")
+        self.assertIsNotNone(pending.payout_batch_id)
+
+
+class RedemptionAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(phone="9000000005", is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+        self.user = User.objects.create(phone="9000000006")
+        payment = PaymentOption.objects.create(user=self.user, type="upi", upi_id="r@upi")
+        PointsBalance.objects.create(user=self.user, available=20)
+        self.redemption = RedemptionRequest.objects.create(user=self.user, points=30, payment_method=payment)
+
+    def test_balance_fields_are_read_only(self):
+        url = reverse("admin:rewards_redemptionrequest_change", args=[self.redemption.pk])
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        for field in ("status", "points", "user"):
+            self.assertNotIn(f'name="{field}"', response.content.decode())
+
+    def test_reject_action_refunds(self):
+        response = self.client.post(reverse("admin:rewards_redemptionrequest_changelist"), {
+            "action": "reject_selected",
+            "_selected_action": [self.redemption.pk],
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.redemption.refresh_from_db()
+        self.assertEqual(self.redemption.status, "rejected")
+        self.assertEqual(PointsBalance.objects.get(user=self.user).available, 50)
+
+    def changelist_queries(self, rows):
+        payment = self.redemption.payment_method
+        for n in range(rows):
+            RedemptionRequest.objects.create(user=self.user, points=1, payment_method=payment)
+        approve_requests(RedemptionRequest.objects.all(), self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse("admin:rewards_redemptionrequest_changelist")).status_code, 200)
+        RedemptionRequest.objects.exclude(pk=self.redemption.pk).delete()
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.assertEqual(self.changelist_queries(2), self.changelist_queries(20))
+
+
+class MediaAccessTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_SENDFILE="")
+        override.enable()
+        self.addCleanup(override.disable)
+        for name in ("redemptions/proof.jpg", "media/products/paint.jpg"):
+            os.makedirs(os.path.join(self.media_root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), "wb") as file:
+                file.write(b"not really a jpeg")
+        self.staff = User.objects.create(phone="9000000007", is_staff=True)
+        self.owner = User.objects.create(phone="9000000008")
+
+    def get(self, path, user=None):
+        request = RequestFactory().get(f"/media/{path}")
+        request.user = user or AnonymousUser()
+        return serve_media(request, path)
+
+    def test_redemption_photos_are_staff_only(self):
+        self.assertEqual(self.get("redemptions/proof.jpg").status_code, 403)
+        self.assertEqual(self.get("redemptions/proof.jpg", self.owner).status_code, 403)
+
+        response = self.get("redemptions/proof.jpg", self.staff)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Cache-Control"].startswith("private"))
+
+    def test_prefix_check_cannot_be_side_stepped(self):
+        self.assertEqual(self.get("media/products/../../redemptions/proof.jpg").status_code, 403)
+        self.assertEqual(self.get("../outside.jpg").status_code, 404)
+
+    def test_product_images_are_public(self):
+        response = self.get("media/products/paint.jpg")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Cache-Control"].startswith("public"))
+
+    def test_variants_of_redemption_photos_are_staff_only(self):
+        request = RequestFactory().get("/")
+        request.user = self.owner
+
+        self.assertEqual(media_variant(request, 400, "webp", "redemptions/proof.jpg").status_code, 403)
+
+
+@override_settings(AUTOCOMPLETE_LIMIT=3)
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create(phone="9000000009", is_staff=True))
+        # Created out of order, so catalog order isn't alphabetical
+        for name in ("Paint E", "Paint B", "Paint D", "Paint A", "Paint C", "Primer"):
+            Product.objects.create(name=name, points=5)
+        User.objects.create(phone="9020000001")
+        User.objects.create(phone="9020000002")
+
+    def results(self, name, query):
+        response = self.client.get(reverse(name), {"q": query})
+        return [row["text"] for row in response.json()["results"]]
+
+    def test_short_queries_match_nothing(self):
+        self.assertEqual(self.results("autocomplete_products", "pa"), [])
+        self.assertEqual(self.results("autocomplete_users", "90"), [])
+
+    def test_products_are_the_alphabetically_first_matches(self):
+        self.assertEqual(self.results("autocomplete_products", "PAI"), ["Paint A", "Paint B", "Paint C"])
+
+    def test_users_by_phone_prefix(self):
+        self.assertEqual(self.results("autocomplete_users", "902000"), ["9020000001", "9020000002"])
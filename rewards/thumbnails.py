@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+logger = logging.getLogger('rewards')
+
+# Output formats a variant can be requested in: (PIL format, content type)
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+_lock = threading.Lock()
+_written_since_sweep = 0
+
+
+def variant_url(field_file, width, fmt="webp"):
+    """URL of a resized variant of an ImageField file; empty string if there is no file."""
+    if not field_file:
+        return ""
+    return reverse("media_variant", args=[width, fmt, field_file.name])
+
+
+def source_fingerprint(name):
+    """Hash identifying one version of a source file (its name, size and mtime)."""
+    stat = os.stat(default_storage.path(name))
+    return hashlib.sha256(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+
+
+def get_variant(name, width, fmt):
+    """
+    Return the path of the cached variant, generating it on first request.
+    Cached files are keyed by source fingerprint and size, so replacing the
+    source naturally misses the cache. Returns None for unknown sizes/formats.
+    """
+    if width not in settings.THUMBNAIL_WIDTHS or fmt not in FORMATS:
+        return None
+
+    key = source_fingerprint(name)
+    path = os.path.join(settings.THUMBNAIL_ROOT, key[:2], f"{key}-{width}.{fmt}")
+    if os.path.exists(path):
+        # mtime doubles as the LRU clock
+        os.utime(path)
+        return path
+
+    _generate(default_storage.path(name), path, width, fmt)
+    _account(os.path.getsize(path))
+    return path
+
+
+def _generate(source_path, path, width, fmt):
+    from PIL import Image, ImageOps
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        pil_format = FORMATS[fmt][0]
+        if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, format=pil_format, quality=settings.THUMBNAIL_QUALITY, optimize=True)
+    os.replace(tmp_path, path)
+
+
+def _account(size):
+    """Sweep the cache once enough new bytes were written since the last sweep."""
+    global _written_since_sweep
+    with _lock:
+        _written_since_sweep += size
+        if _written_since_sweep < settings.THUMBNAIL_CACHE_MAX_BYTES // 20:
+            return
+        _written_since_sweep = 0
+    evict()
+
+
+def evict(max_bytes=None):
+    """Delete least recently used variants until the cache fits in 90% of its budget."""
+    max_bytes = settings.THUMBNAIL_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    total = 0
+    for dirpath, _, filenames in os.walk(settings.THUMBNAIL_ROOT):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    target = max_bytes * 0.9
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    logger.info("Thumbnail cache evicted", extra={'removed': removed, 'bytes': total})
+    return removed
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -26,10 +27,20 @@ urlpatterns = [
     # Users
     path('users/', views.user_list, name='user_list'),
     path('users/<int:pk>/', views.user_detail, name='user_detail'),
+    path('users/<int:pk>/history/', views.user_history_rows, name='user_history_rows'),
     
     # Reward History
     path('rewards/', views.reward_history, name='reward_history'),
+
+    # Filter autocomplete
+    path('autocomplete/users/', views.autocomplete_users, name='autocomplete_users'),
+    path('autocomplete/products/', views.autocomplete_products, name='autocomplete_products'),
     
+    # Redemption requests
+    path('redemptions/', views.redemption_queue, name='redemption_queue'),
+    path('redemptions/bulk/', views.redemption_bulk_action, name='redemption_bulk_action'),
+    path('redemptions/batches/<int:pk>/csv/', views.payout_batch_csv, name='payout_batch_csv'),
+
     # Export
     path('export/users/csv/', views.export_users_csv, name='export_users_csv'),
     path('export/rewards/csv/', views.export_rewards_csv, name='export_rewards_csv'),
@@ -40,7 +51,12 @@ urlpatterns = [
     path('mobile/privacy-policy/', views.privacy_policy_page, name='mobile_privacy_policy'),
     path('mobile/delete-account/', views.delete_account_page, name='mobile_delete_account'),
 
+    # resized, cached variants of uploaded images
+    path('media-variants/<int:width>/<str:fmt>/<path:name>', views.media_variant, name='media_variant'),
+
     # to check redeem code status   
-    path('redeem/<uuid:uuid_str>/', views.qr_code_status, name='qr_code_status'),
+    path('redeem/<str:uuid_str>/', views.qr_code_status_async if settings.ASYNC_VIEWS else views.qr_code_status, name='qr_code_status'),
+    # Compact payload printed with QR_PAYLOAD_FORMAT=compact
+    path('R/<str:uuid_str>', views.qr_code_status_async if settings.ASYNC_VIEWS else views.qr_code_status, name='qr_code_status_compact'),
 
 ]
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Cheap version stamps for per-user API data.
+
+Each user has a random token in the cache that is replaced whenever their
+reward history or redemption requests change; a global token does the same
+for product changes (names appear in every history row). Together they make
+an ETag that can be checked without touching the database. Tokens are random
+rather than counters, so a token lost to cache eviction never comes back
+with the value an old ETag was built from.
+
+A per-process cache (LocMem) never sees another worker's bump, so there the
+tokens expire after LOCAL_VERSION_TIMEOUT seconds, bounding how long a worker
+can answer 304 or keep an old catalog.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = "catalog_version"
+
+PER_PROCESS_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def _timeout():
+    if settings.CACHES["default"]["BACKEND"] in PER_PROCESS_BACKENDS:
+        return settings.LOCAL_VERSION_TIMEOUT
+    return None
+
+
+def user_version_key(user_id):
+    return f"user_data_version_{user_id}"
+
+
+def _version_keys(user_id):
+    return [user_version_key(user_id), CATALOG_VERSION_KEY]
+
+
+def _ensure(versions, keys):
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, timeout=_timeout())
+        # Another process may have added first; a cache that keeps nothing (DummyCache)
+        # returns neither, and the fresh token means nothing is ever a match
+        versions.update(missing)
+        versions.update(cache.get_many(missing.keys()))
+    return versions
+
+
+def catalog_version():
+    return _ensure(cache.get_many([CATALOG_VERSION_KEY]), [CATALOG_VERSION_KEY])[CATALOG_VERSION_KEY]
+
+
+def user_data_etag(user_id):
+    keys = _version_keys(user_id)
+    versions = _ensure(cache.get_many(keys), keys)
+    return '"%s"' % "-".join(versions[key] for key in keys)
+
+
+async def auser_data_etag(user_id):
+    keys = _version_keys(user_id)
+    versions = await cache.aget_many(keys)
+    if len(versions) < len(keys):
+        from asgiref.sync import sync_to_async
+        versions = await sync_to_async(_ensure)(versions, keys)
+    return '"%s"' % "-".join(versions[key] for key in keys)
+
+
+def bump_user_version(user_id):
+    cache.set(user_version_key(user_id), uuid.uuid4().hex, timeout=_timeout())
+
+
+def bump_user_versions(user_ids):
+    cache.set_many({user_version_key(user_id): uuid.uuid4().hex for user_id in user_ids}, timeout=_timeout())
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=_timeout())
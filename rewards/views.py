@@ -1,19 +1,36 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.core.paginator import Paginator
 import csv
-import hashlib
+import heapq
 import logging
-from .models import Product, ProductQRCode, User, RewardHistory, PaymentOption
+import os
+from itertools import chain
+from django.conf import settings
+from .models import Product, ProductQRCode, User, RewardHistory, PaymentOption, PayoutBatch, RedemptionRequest, ArchivedQRCode, ArchivedRewardHistory, PointsBalance
 from .forms import ProductForm, QRCodeGenerateForm
 from django.shortcuts import get_object_or_404, render
-from django.http import HttpResponseNotFound
+from django.http import HttpResponseForbidden, HttpResponseNotFound
+from django.utils._os import safe_join
+from django.views.decorators.http import require_safe
+from django.utils.cache import add_never_cache_headers
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Count, Max, Q, Sum
+from django.utils.dateparse import parse_datetime
 from .models import ProductQRCode
 from django.contrib.auth import login as auth_login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from .forms import AdminAuthenticationForm
+from .media import is_staff_media, media_cache_control, serve_file
+from .payouts import approve_requests, payout_rows, reject_requests
+from .archive import aarchived_status, archived_status
+from .catalog import get_catalog, get_product
+from .qr_payload import parse_code
+from .response_cache import cached_response, qr_status_key
+from .thumbnails import FORMATS, get_variant
 
 # Module logger
 logger = logging.getLogger('rewards')
@@ -67,8 +84,10 @@ def dashboard_home(request):
     try:
         total_products = Product.objects.count()
         total_users = User.objects.count()
-        total_qr_codes = ProductQRCode.objects.count()
-        redeemed_qr_codes = ProductQRCode.objects.filter(status='redeemed').count()
+        # Archived codes were all redeemed; count them so totals don't drop after an archive run
+        archived_qr_codes = ArchivedQRCode.objects.count()
+        total_qr_codes = ProductQRCode.objects.count() + archived_qr_codes
+        redeemed_qr_codes = ProductQRCode.objects.filter(status='redeemed').count() + archived_qr_codes
         logger.debug("Dashboard metrics computed", extra={'total_products': total_products, 'total_users': total_users, 'total_qr_codes': total_qr_codes, 'redeemed_qr_codes': redeemed_qr_codes})
         context = {
             'total_products': total_products,
@@ -171,12 +190,11 @@ def qrcode_list(request):
     paginator = Paginator(qrcodes, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
-    products = Product.objects.all()
     
     logger.debug("QR code list filtered", extra={'product_filter': product_filter, 'status_filter': status_filter, 'count': qrcodes.count()})
     return render(request, 'dashboard/qrcodes/list.html', {
         'page_obj': page_obj,
-        'products': products,
+        'selected_product': _selected_product(product_filter),
         'product_filter': product_filter,
         'status_filter': status_filter
     })
@@ -197,7 +215,7 @@ def qrcode_generate(request):
                     qr = ProductQRCode.objects.create(product=product)
                     qrcodes.append(qr)
                 
-                request.session['qrcodes_to_print'] = [str(qr.code) for qr in qrcodes]
+                request.session['qrcodes_to_print'] = [qr.id for qr in qrcodes]
                 messages.success(request, f'{quantity} QR codes generated successfully!')
                 return redirect('qrcode_print')
             else:
@@ -215,7 +233,7 @@ def qrcode_generate(request):
 @user_passes_test(is_staff_user)
 def qrcode_print(request):
     qrcode_ids = request.session.get('qrcodes_to_print', [])
-    qrcodes = ProductQRCode.objects.filter(code__in=qrcode_ids)
+    qrcodes = ProductQRCode.objects.filter(id__in=qrcode_ids)
     logger.debug("Preparing QR codes for print", extra={'count': qrcodes.count()})
     
     if 'qrcodes_to_print' in request.session:
@@ -257,19 +275,82 @@ def user_list(request):
     
     return render(request, 'dashboard/users/list.html', {'page_obj': page_obj})
 
+USER_HISTORY_PAGE_SIZE = 50
+USER_PAYMENT_OPTIONS_SHOWN = 20
+
+
+def _user_stats(user_id):
+    """Lifetime totals and per-product scan counts: one grouped query plus one over the archive."""
+    by_product = list(
+        RewardHistory.objects.filter(user_id=user_id).values('product_id').annotate(
+            scans=Count('id'), points=Sum('points_earned'), last_scan=Max('created_at'),
+        ).order_by('-scans')
+    )
+    for row in by_product:
+        product = get_product(row['product_id']) if row['product_id'] else None
+        row['product_name'] = product.name if product else None
+    archived = ArchivedRewardHistory.objects.filter(user_id=user_id).aggregate(
+        scans=Count('id'), points=Sum('points_earned'), last_scan=Max('created_at'),
+    )
+    # A user whose rewards were all archived still has a last activity
+    last_scans = [row['last_scan'] for row in by_product] + [archived['last_scan']]
+    return {
+        'by_product': by_product,
+        'total_scans': sum(row['scans'] for row in by_product) + archived['scans'],
+        'total_points': sum(row['points'] for row in by_product) + (archived['points'] or 0),
+        'archived_scans': archived['scans'],
+        'last_activity': max((scan for scan in last_scans if scan is not None), default=None),
+    }
+
+
+def _user_history_page(user_id, before=''):
+    """
+    One page of a user's rewards, newest first. `before` is the keyset
+    cursor "<created_at>,<id>" of the last row shown; pages are read off
+    rewardhistory_user_created_idx however deep they go.
+    """
+    history = RewardHistory.objects.filter(user_id=user_id)
+    created_at, _, last_id = before.rpartition(',')
+    created_at = parse_datetime(created_at) if created_at else None
+    if created_at and last_id.isdigit():
+        history = history.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=int(last_id))
+        )
+    page = list(
+        history.order_by('-created_at', '-id').values(
+            'id', 'product_id', 'qr_code_id', 'points_earned', 'created_at'
+        )[:USER_HISTORY_PAGE_SIZE + 1]
+    )
+    next_before = None
+    if len(page) > USER_HISTORY_PAGE_SIZE:
+        page = page[:USER_HISTORY_PAGE_SIZE]
+        next_before = f"{page[-1]['created_at'].isoformat()},{page[-1]['id']}"
+    for row in page:
+        product = get_product(row['product_id']) if row['product_id'] else None
+        row['product_name'] = product.name if product else None
+    return page, next_before
+
+
 @login_required
 @user_passes_test(is_staff_user)
 def user_detail(request, pk):
     try:
         user = get_object_or_404(User, pk=pk)
-        reward_history = RewardHistory.objects.filter(user=user).order_by('-created_at')
-        payment_options = PaymentOption.objects.filter(user=user)
-        logger.debug("User detail viewed", extra={'user_id': user.id, 'history_count': reward_history.count()})
+        stats = _user_stats(user.id)
+        reward_history, next_before = _user_history_page(user.id)
+        payment_options = list(
+            PaymentOption.objects.filter(user=user).order_by('-created_at')[:USER_PAYMENT_OPTIONS_SHOWN + 1]
+        )
+        logger.debug("User detail viewed", extra={'user_id': user.id, 'total_scans': stats['total_scans']})
         
         context = {
             'user_obj': user,  # Using 'user_obj' to avoid conflict with request.user
+            'stats': stats,
+            'available_points': PointsBalance.objects.filter(user=user).values_list('available', flat=True).first(),
             'reward_history': reward_history,
-            'payment_options': payment_options,
+            'next_before': next_before,
+            'payment_options': payment_options[:USER_PAYMENT_OPTIONS_SHOWN],
+            'more_payment_options': len(payment_options) > USER_PAYMENT_OPTIONS_SHOWN,
         }
         return render(request, 'dashboard/users/detail.html', context)
     except Exception:
@@ -277,6 +358,18 @@ def user_detail(request, pk):
         messages.error(request, 'Failed to load user details.')
         return redirect('user_list')
 
+
+@login_required
+@user_passes_test(is_staff_user)
+def user_history_rows(request, pk):
+    """Next page of user_detail's reward history, as table rows for the "Load more" button."""
+    reward_history, next_before = _user_history_page(pk, request.GET.get('before', ''))
+    return render(request, 'dashboard/users/history_rows.html', {
+        'user_id': pk,
+        'reward_history': reward_history,
+        'next_before': next_before,
+    })
+
 # Reward History views
 @login_required
 @user_passes_test(is_staff_user)
@@ -293,18 +386,149 @@ def reward_history(request):
     paginator = Paginator(rewards, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
-    users = User.objects.all()
-    products = Product.objects.all()
     logger.debug("Reward history filtered", extra={'user_filter': user_filter, 'product_filter': product_filter, 'count': rewards.count()})
     
     return render(request, 'dashboard/rewards/history.html', {
         'page_obj': page_obj,
-        'users': users,
-        'products': products,
+        'selected_user': User.objects.filter(pk=user_filter).only('phone').first() if user_filter and user_filter.isdigit() else None,
+        'selected_product': _selected_product(product_filter),
         'user_filter': user_filter,
         'product_filter': product_filter
     })
 
+# Filter autocomplete: the dashboard filters look options up as the staff member types
+def _selected_product(product_filter):
+    return get_product(int(product_filter)) if product_filter and product_filter.isdigit() else None
+
+
+# Shorter queries match too much of the table to be useful
+AUTOCOMPLETE_MIN_LENGTH = 3
+
+
+def _user_search_key(request):
+    return "".join(ch for ch in request.GET.get('q', '') if ch.isdigit())
+
+
+@login_required
+@user_passes_test(is_staff_user)
+@cached_response('autocomplete_users', settings.AUTOCOMPLETE_CACHE_TIMEOUT, key_func=_user_search_key)
+def autocomplete_users(request):
+    prefix = _user_search_key(request)
+    if len(prefix) < AUTOCOMPLETE_MIN_LENGTH:
+        return JsonResponse({'results': []})
+    # A range on the phone's unique index is a prefix search every backend can seek, unlike LIKE
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    users = User.objects.filter(
+        phone__gte=prefix, phone__lt=upper
+    ).order_by('phone').values_list('id', 'phone')[:settings.AUTOCOMPLETE_LIMIT]
+    return JsonResponse({'results': [{'id': pk, 'text': phone} for pk, phone in users]})
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def autocomplete_products(request):
+    prefix = request.GET.get('q', '').strip().casefold()
+    if len(prefix) < AUTOCOMPLETE_MIN_LENGTH:
+        return JsonResponse({'results': []})
+    # Served from the in-process catalog, so no query at all; the alphabetically first
+    # AUTOCOMPLETE_LIMIT matches, kept in a bounded heap rather than sorting every match
+    matches = heapq.nsmallest(
+        settings.AUTOCOMPLETE_LIMIT,
+        (product for product in get_catalog().values() if product.name.casefold().startswith(prefix)),
+        key=lambda product: product.name.casefold(),
+    )
+    return JsonResponse({'results': [{'id': product.id, 'text': product.name} for product in matches]})
+
+
+# Redemption queue views
+REDEMPTION_PAGE_SIZE = 50
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def redemption_queue(request):
+    status_filter = request.GET.get('status') or 'pending'
+    type_filter = request.GET.get('type') or ''
+    after = request.GET.get('after') or ''
+
+    redemptions = RedemptionRequest.objects.filter(
+        status=status_filter
+    ).select_related('user', 'payment_method').order_by('id')
+    if type_filter:
+        redemptions = redemptions.filter(payment_method__type=type_filter)
+    # Keyset pagination: "rows after the last id seen" stays fast however deep the queue is
+    if after.isdigit():
+        redemptions = redemptions.filter(id__gt=int(after))
+
+    page = list(redemptions[:REDEMPTION_PAGE_SIZE + 1])
+    next_after = page[REDEMPTION_PAGE_SIZE - 1].id if len(page) > REDEMPTION_PAGE_SIZE else None
+    page = page[:REDEMPTION_PAGE_SIZE]
+
+    pending_totals = RedemptionRequest.objects.filter(status='pending').values(
+        'payment_method__type'
+    ).annotate(count=Count('id'), points=Sum('points')).order_by('payment_method__type')
+
+    return render(request, 'dashboard/redemptions/queue.html', {
+        'redemptions': page,
+        'next_after': next_after,
+        'status_filter': status_filter,
+        'type_filter': type_filter,
+        'after': after,
+        'pending_totals': pending_totals,
+        'batches': PayoutBatch.objects.select_related('created_by').order_by('-id')[:10],
+        'status_choices': RedemptionRequest.STATUS_CHOICES,
+        'type_choices': PaymentOption.PAYMENT_CHOICES,
+    })
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def redemption_bulk_action(request):
+    if request.method != 'POST':
+        return redirect('redemption_queue')
+
+    action = request.POST.get('action')
+    type_filter = request.POST.get('type') or ''
+    try:
+        if request.POST.get('scope') == 'all':
+            # Every pending request, optionally of one payment type
+            selected = RedemptionRequest.objects.all()
+            if type_filter:
+                selected = selected.filter(payment_method__type=type_filter)
+        else:
+            ids = [int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()]
+            selected = RedemptionRequest.objects.filter(pk__in=ids)
+
+        if action == 'approve':
+            batches = approve_requests(selected, request.user)
+            approved = sum(batch.request_count for batch in batches)
+            logger.info("Redemptions approved", extra={'count': approved, 'batch_ids': [b.id for b in batches]})
+            messages.success(request, f'Approved {approved} requests into {len(batches)} payout batch(es).')
+        elif action == 'reject':
+            rejected = reject_requests(selected)
+            logger.info("Redemptions rejected", extra={'count': rejected})
+            messages.success(request, f'Rejected {rejected} requests.')
+        else:
+            messages.error(request, 'Unknown action.')
+    except Exception:
+        logger.exception("Bulk redemption action failed", extra={'action': action})
+        messages.error(request, 'Could not process the selected requests. Please try again.')
+
+    query = f'?type={type_filter}' if type_filter else ''
+    return redirect(f"{reverse('redemption_queue')}{query}")
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def payout_batch_csv(request, pk):
+    batch = get_object_or_404(PayoutBatch, pk=pk)
+    # Streamed straight from the database cursor; large batches never sit in memory
+    response = StreamingHttpResponse(payout_rows(batch), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="payout-batch-{batch.pk}-{batch.payment_type}.csv"'
+    logger.info("Payout batch exported", extra={'batch_id': batch.pk, 'count': batch.request_count})
+    return response
+
+
 # Export data views
 @login_required
 @user_passes_test(is_staff_user)
@@ -346,7 +570,11 @@ def export_rewards_csv(request):
         writer = csv.writer(response)
         writer.writerow(['User Phone', 'Product', 'Points Earned', 'Date'])
 
-        rewards = RewardHistory.objects.select_related('user', 'product').all()
+        # Rewards moved to the archive are still part of the export
+        rewards = chain(
+            RewardHistory.objects.select_related('user', 'product').order_by('id').iterator(chunk_size=2000),
+            ArchivedRewardHistory.objects.select_related('user', 'product').order_by('id').iterator(chunk_size=2000),
+        )
         count = 0
         for reward in rewards:
             writer.writerow([
@@ -364,40 +592,124 @@ def export_rewards_csv(request):
         return HttpResponse("Failed to export rewards", status=500)
 
 
+@cached_response('qr_status', settings.QR_STATUS_CACHE_TIMEOUT, key_func=qr_status_key)
 def qr_code_status(request, uuid_str):
     try:
-        # Ensure uuid_str is always a string before hashing
-        plain_code = str(uuid_str)
-        code_hash = hashlib.sha256(plain_code.encode()).hexdigest()
-
-        qr_code = ProductQRCode.objects.filter(code_hash=code_hash).first()
-        if not qr_code:
+        # Any payload format; None if it is not a code at all
+        plain_code = parse_code(uuid_str)
+
+        if plain_code is None:
+            # Malformed or badly signed: answered without the database, and not cached
+            response = render(request, 'public/qr_code_status.html', {'status': "Invalid"})
+            add_never_cache_headers(response)
+            return response
+
+        qr_status = ProductQRCode.objects.for_code(plain_code).values_list('status', flat=True).first()
+        if qr_status is None:
+            # Old redeemed codes live in the archive
+            qr_status = archived_status(plain_code)
+        if qr_status is None:
             logger.warning("QR code not found", extra={'code': plain_code})
             return render(request, 'public/qr_code_status.html', {
                 'status': "Invalid",
             })
 
-        logger.debug("QR code status fetched", extra={'code': plain_code, 'status': qr_code.status})
+        logger.debug("QR code status fetched", extra={'code': plain_code, 'status': qr_status})
         return render(request, 'public/qr_code_status.html', {
-            'status': qr_code.status,
+            'status': qr_status,
         })
 
     except Exception:
         logger.exception("Error resolving qr_code_status", extra={'code': str(uuid_str)})
+        response = render(request, 'public/qr_code_status.html', {
+            'status': "Invalid",
+        })
+        add_never_cache_headers(response)
+        return response
+
+
+@cached_response('qr_status', settings.QR_STATUS_CACHE_TIMEOUT, key_func=qr_status_key)
+async def qr_code_status_async(request, uuid_str):
+    """ASGI-native qr_code_status; renders the same page without a worker thread."""
+    try:
+        plain_code = parse_code(uuid_str)
+
+        if plain_code is None:
+            response = render(request, 'public/qr_code_status.html', {'status': "Invalid"})
+            add_never_cache_headers(response)
+            return response
+
+        qr_status = await ProductQRCode.objects.for_code(plain_code).values_list('status', flat=True).afirst()
+        if qr_status is None:
+            qr_status = await aarchived_status(plain_code)
+        if qr_status is None:
+            logger.warning("QR code not found", extra={'code': plain_code})
+            return render(request, 'public/qr_code_status.html', {
+                'status': "Invalid",
+            })
+
+        logger.debug("QR code status fetched", extra={'code': plain_code, 'status': qr_status})
         return render(request, 'public/qr_code_status.html', {
+            'status': qr_status,
+        })
+
+    except Exception:
+        logger.exception("Error resolving qr_code_status", extra={'code': str(uuid_str)})
+        response = render(request, 'public/qr_code_status.html', {
             'status': "Invalid",
         })
+        add_never_cache_headers(response)
+        return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Uploaded media with ETag/304 and range support, or handed off to the proxy."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        return HttpResponseNotFound()
+    if not os.path.isfile(full_path):
+        return HttpResponseNotFound()
+    name = os.path.relpath(full_path, settings.MEDIA_ROOT)
+    if is_staff_media(name) and not is_staff_user(request.user):
+        return HttpResponseForbidden()
+    return serve_file(request, full_path, cache_control=media_cache_control(name))
+
+
+@require_safe
+def media_variant(request, width, fmt, name):
+    """Resized WebP/JPEG variant of an uploaded image, generated and cached on first request."""
+    if is_staff_media(name) and not is_staff_user(request.user):
+        return HttpResponseForbidden()
+    try:
+        path = get_variant(name, width, fmt)
+    except (FileNotFoundError, SuspiciousFileOperation):
+        return HttpResponseNotFound()
+    except Exception:
+        logger.exception("Failed to build image variant", extra={'name': name, 'width': width, 'fmt': fmt})
+        return HttpResponseNotFound()
+    if path is None:
+        return HttpResponseNotFound()
+
+    return serve_file(request, path, content_type=FORMATS[fmt][1], cache_control=media_cache_control(name, 86400))
 
 
 # Static pages for mobile app
+mobile_page_cache = cached_response('mobile_page', settings.STATIC_PAGE_CACHE_TIMEOUT, browser_max_age=60 * 60)
+
+@mobile_page_cache
 def about_page(request):
     return render(request, 'mobile_pages/about.html')
 
+@mobile_page_cache
 def contact_page(request):
     return render(request, 'mobile_pages/contact.html')
 
+@mobile_page_cache
 def privacy_policy_page(request):
     return render(request, 'mobile_pages/privacy_policy.html')
 
+@mobile_page_cache
 def delete_account_page(request):
     return render(request, 'mobile_pages/delete_account.html')
\ No newline at end of file
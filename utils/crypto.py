@@ -1,12 +1,22 @@
-from cryptography.fernet import Fernet
+from functools import lru_cache
+
 from django.conf import settings
 
-cipher = Fernet(settings.ENCRYPTION_KEY)
+
+def build_cipher(keys):
+    from cryptography.fernet import Fernet, MultiFernet
+    return MultiFernet([Fernet(key) for key in keys])
+
+
+@lru_cache(maxsize=None)
+def get_cipher():
+    """Build the cipher on first use rather than at import. Encrypts with the first key, decrypts with any."""
+    return build_cipher(settings.ENCRYPTION_KEYS)
 
 def encrypt_text(plain_text: str) -> str:
     """Encrypt a plain text string."""
-    return cipher.encrypt(plain_text.encode()).decode()
+    return get_cipher().encrypt(plain_text.encode()).decode()
     
 def decrypt_text(encrypted_text: str) -> str:
     """Decrypt an encrypted string."""
-    return cipher.decrypt(encrypted_text.encode()).decode()
\ No newline at end of file
+    return get_cipher().decrypt(encrypted_text.encode()).decode()